@@ -37,6 +37,8 @@ class Admin(object):
         self._services_manager = ServicesManager(db, container_manager)
 
     def seed(self):
+        self._db.create_tables()
+
         with self._db:
             self._seed_users()
 
@@ -117,9 +119,7 @@ class Admin(object):
         if train_job is None:
             raise InvalidTrainJobException()
 
-        workers = self._db.get_workers_of_train_job(train_job.id)
-        services = [self._db.get_service(x.service_id) for x in workers]
-        worker_models = [self._db.get_model(x.model_id) for x in workers]
+        workers = self._db.get_workers_with_services_of_train_job(train_job.id)
 
         return {
             'id': train_job.id,
@@ -141,8 +141,7 @@ class Admin(object):
                     'datetime_stopped': service.datetime_stopped,
                     'model_name': model.name
                 }
-                for (worker, service, model) 
-                in zip(workers, services, worker_models)
+                for (worker, service, model) in workers
             ]
         }
 
@@ -169,8 +168,7 @@ class Admin(object):
         if train_job is None:
             raise InvalidTrainJobException()
 
-        best_trials = self._db.get_best_trials_of_train_job(train_job.id, max_count=max_count)
-        best_trials_models = [self._db.get_model(x.model_id) for x in best_trials]
+        best_trials = self._db.get_best_trials_with_models_of_train_job(train_job.id, max_count=max_count)
         return [
             {
                 'id': trial.id,
@@ -180,7 +178,7 @@ class Admin(object):
                 'model_name': model.name,
                 'score': trial.score
             }
-            for (trial, model) in zip(best_trials, best_trials_models)
+            for (trial, model) in best_trials
         ]
 
     def get_train_jobs_by_user(self, user_id):
@@ -206,8 +204,7 @@ class Admin(object):
         if train_job is None:
             raise InvalidTrainJobException()
 
-        trials = self._db.get_trials_of_train_job(train_job.id)
-        trials_models = [self._db.get_model(x.model_id) for x in trials]
+        trials = self._db.get_trials_with_models_of_train_job(train_job.id)
         return [
             {
                 'id': trial.id,
@@ -218,7 +215,7 @@ class Admin(object):
                 'model_name': model.name,
                 'score': trial.score
             }
-            for (trial, model) in zip(trials, trials_models)
+            for (trial, model) in trials
         ]
 
     def stop_train_job_worker(self, service_id):
@@ -234,8 +231,7 @@ class Admin(object):
     ####################################
     
     def get_trial(self, trial_id):
-        trial = self._db.get_trial(trial_id)
-        model = self._db.get_model(trial.model_id)
+        (trial, model) = self._db.get_trial_with_model(trial_id)
         
         if trial is None:
             raise InvalidTrialException()
@@ -252,7 +248,7 @@ class Admin(object):
         }
 
     def get_trial_logs(self, trial_id):
-        trial = self._db.get_trial(trial_id)
+        trial = self._db.get_trial(trial_id, with_logs=True)
         if trial is None:
             raise InvalidTrialException()
 
@@ -271,7 +267,7 @@ class Admin(object):
     # Inference Job
     ####################################
 
-    def create_inference_job(self, user_id, app, app_version):
+    def create_inference_job(self, user_id, app, app_version, slo=None):
         train_job = self._db.get_train_job_by_app_version(app, app_version=app_version)
         if train_job is None:
             raise InvalidTrainJobException('Have you started a train job for this app?')
@@ -286,7 +282,8 @@ class Admin(object):
 
         inference_job = self._db.create_inference_job(
             user_id=user_id,
-            train_job_id=train_job.id
+            train_job_id=train_job.id,
+            slo=slo
         )
         self._db.commit()
 
@@ -327,12 +324,9 @@ class Admin(object):
         if inference_job is None:
             raise InvalidRunningInferenceJobException()
             
-        workers = self._db.get_workers_of_inference_job(inference_job.id)
-        services = [self._db.get_service(x.service_id) for x in workers]
+        workers = self._db.get_workers_with_services_of_inference_job(inference_job.id)
         predictor_service = self._db.get_service(inference_job.predictor_service_id)
         predictor_host = self._get_service_host(predictor_service)
-        worker_trials = [self._db.get_trial(x.trial_id) for x in workers]
-        worker_trial_models = [self._db.get_model(x.model_id) for x in worker_trials]
 
         return {
             'id': inference_job.id,
@@ -342,6 +336,7 @@ class Admin(object):
             'app_version': train_job.app_version,
             'datetime_started': inference_job.datetime_started,
             'datetime_stopped': inference_job.datetime_stopped,
+            'slo': inference_job.slo,
             'predictor_host': predictor_host,
             'workers': [
                 {
@@ -357,16 +352,12 @@ class Admin(object):
                         'model_name': model.name
                     }
                 }
-                for (worker, service, trial, model) 
-                in zip(workers, services, worker_trials, worker_trial_models)
+                for (worker, service, trial, model) in workers
             ]
         }
 
     def get_inference_jobs_of_app(self, app):
-        inference_jobs = self._db.get_inference_jobs_of_app(app)
-        train_jobs = [self._db.get_train_job(x.train_job_id) for x in inference_jobs]
-        predictor_services = [self._db.get_service(x.predictor_service_id) for x in inference_jobs]
-        predictor_hosts = [self._get_service_host(x) for x in predictor_services]
+        inference_jobs = self._db.get_inference_jobs_with_train_jobs_of_app(app)
         return [
             {
                 'id': inference_job.id,
@@ -376,16 +367,13 @@ class Admin(object):
                 'app_version': train_job.app_version,
                 'datetime_started': inference_job.datetime_started,
                 'datetime_stopped': inference_job.datetime_stopped,
-                'predictor_host': predictor_host
+                'predictor_host': self._get_service_host(predictor_service)
             }
-            for (inference_job, train_job, predictor_host) in zip(inference_jobs, train_jobs, predictor_hosts)
+            for (inference_job, train_job, predictor_service) in inference_jobs
         ]
 
     def get_inference_jobs_by_user(self, user_id):
-        inference_jobs = self._db.get_inference_jobs_by_user(user_id)
-        train_jobs = [self._db.get_train_job(x.train_job_id) for x in inference_jobs]
-        predictor_services = [self._db.get_service(x.predictor_service_id) for x in inference_jobs]
-        predictor_hosts = [self._get_service_host(x) for x in predictor_services]
+        inference_jobs = self._db.get_inference_jobs_with_train_jobs_by_user(user_id)
         return [
             {
                 'id': inference_job.id,
@@ -395,9 +383,9 @@ class Admin(object):
                 'app_version': train_job.app_version,
                 'datetime_started': inference_job.datetime_started,
                 'datetime_stopped': inference_job.datetime_stopped,
-                'predictor_host': predictor_host
+                'predictor_host': self._get_service_host(predictor_service)
             }
-            for (inference_job, train_job, predictor_host) in zip(inference_jobs, train_jobs, predictor_hosts)
+            for (inference_job, train_job, predictor_service) in inference_jobs
         ]
 
     ####################################
@@ -174,6 +174,9 @@ def create_inference_jobs(auth):
     if 'app_version' in params:
         params['app_version'] = int(params['app_version'])
 
+    if params.get('slo') is not None:
+        params['slo'] = float(params['slo'])
+
     with admin:
         return jsonify(admin.create_inference_job(auth['user_id'], **params))
 
@@ -69,9 +69,8 @@ class ServicesManager(object):
         self._stop_service(service)
 
         # Stop all workers for inference job
-        workers = self._db.get_workers_of_inference_job(inference_job_id)
-        for worker in workers:
-            service = self._db.get_service(worker.service_id)
+        workers = self._db.get_workers_with_services_of_inference_job(inference_job_id)
+        for (worker, service, _, _) in workers:
             self._stop_service(service)
 
         self._db.mark_inference_job_as_stopped(inference_job)
@@ -208,8 +207,8 @@ class ServicesManager(object):
         self._update_train_job_status(train_job)
 
     def _update_train_job_status(self, train_job):
-        workers = self._db.get_workers_of_train_job(train_job.id)
-        services = [self._db.get_service(x.service_id) for x in workers]
+        workers = self._db.get_workers_with_services_of_train_job(train_job.id)
+        services = [service for (_, service, _) in workers]
         
         # If all workers for the train job have stopped, stop train job as well
         if next((
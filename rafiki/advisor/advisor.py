@@ -18,6 +18,11 @@ class BaseAdvisor(abc.ABC):
     def propose(self):
         raise NotImplementedError()
 
+    # Proposes `count` sets of knobs to be tried in parallel, given sets of knobs that are pending feedback
+    # Advisors that can diversify batches of proposals should override this
+    def propose_batch(self, count, pending_knobs_list):
+        return [self.propose() for _ in range(count)]
+
     @abc.abstractmethod
     def feedback(self, knobs, score):
         raise NotImplementedError()
@@ -33,16 +38,27 @@ class Advisor():
         return self._knob_config
 
     def propose(self):
-        knobs = self._advisor.propose()
+        return self.propose_batch(1)[0]
+
+    # Proposes `count` diverse sets of knobs, given sets of knobs that are pending feedback (e.g. being tried
+    # in parallel trials), so that the proposals explore different regions
+    def propose_batch(self, count, pending_knobs_list=None):
+        if pending_knobs_list is None:
+            pending_knobs_list = []
+
+        knobs_list = self._advisor.propose_batch(count, pending_knobs_list)
 
         # Simplify knobs to use JSON serializable values
-        knobs = {
-            name: self._simplify_value(value)
-                for name, value
-                in knobs.items()
-        }
+        knobs_list = [
+            {
+                name: self._simplify_value(value)
+                    for name, value
+                    in knobs.items()
+            }
+            for knobs in knobs_list
+        ]
 
-        return knobs
+        return knobs_list
 
     def feedback(self, knobs, score):
         self._advisor.feedback(knobs, score)
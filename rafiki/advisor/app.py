@@ -48,6 +48,18 @@ def generate_proposal(auth, advisor_id):
     params = get_request_params()
     return jsonify(service.generate_proposal(advisor_id, **params))
 
+@app.route('/advisors/<advisor_id>/propose_batch', methods=['POST'])
+@auth([UserType.ADMIN, UserType.APP_DEVELOPER])
+def generate_proposals(auth, advisor_id):
+    params = get_request_params()
+    return jsonify(service.generate_proposals(advisor_id, **params))
+
+@app.route('/advisors/<advisor_id>/release', methods=['POST'])
+@auth([UserType.ADMIN, UserType.APP_DEVELOPER])
+def release_proposals(auth, advisor_id):
+    params = get_request_params()
+    return jsonify(service.release_proposals(advisor_id, **params))
+
 @app.route('/advisors/<advisor_id>/feedback', methods=['POST'])
 @auth([UserType.ADMIN, UserType.APP_DEVELOPER])
 def feedback(auth, advisor_id):
@@ -1,3 +1,4 @@
+import copy
 from btb.tuning import GP
 from btb import HyperParameter, ParamTypes
 
@@ -14,13 +15,34 @@ class BtbGpAdvisor(BaseAdvisor):
 
         # TODO: Allow configuration of tuner
         self._tuner = GP(tunables=tunables)
+        self._scores = []
 
     def propose(self):
         knobs = self._tuner.propose()
         return knobs
 
+    # Uses the constant liar strategy: pending & newly proposed knobs are added to a copy of the tuner
+    # with the worst score observed so far, so that later proposals in the batch are steered away from them
+    def propose_batch(self, count, pending_knobs_list):
+        if count == 1 and len(pending_knobs_list) == 0:
+            return [self.propose()]
+
+        lie_score = min(self._scores, default=0)
+        tuner = copy.deepcopy(self._tuner)
+        for knobs in pending_knobs_list:
+            tuner.add(knobs, lie_score)
+
+        knobs_list = []
+        for _ in range(count):
+            knobs = tuner.propose()
+            knobs_list.append(knobs)
+            tuner.add(knobs, lie_score)
+
+        return knobs_list
+
     def feedback(self, knobs, score):
         self._tuner.add(knobs, score)
+        self._scores.append(score)
 
     def _get_tunables(self, knobs):
         tunables = [
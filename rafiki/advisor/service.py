@@ -4,6 +4,11 @@ import os
 import uuid
 import traceback
 import pprint
+from contextlib import contextmanager
+from redis.exceptions import LockError
+
+from rafiki.cache import Cache
+from rafiki.config import ADVISOR_PENDING_PROPOSAL_TIMEOUT, ADVISOR_LOCK_TIMEOUT
 
 from .advisor import Advisor
 
@@ -11,23 +16,25 @@ logger = logging.getLogger(__name__)
 
 class InvalidAdvisorException(Exception): pass
 class InvalidProposalException(Exception): pass
+class AdvisorBusyException(Exception): pass
 
 class AdvisorService(object):
-    def __init__(self):
-        self._advisors = {}
+    '''
+    Advisors' state (knob configs, observed knobs & scores, and pending proposals) is kept in cache,
+    so that any replica of the service can serve any advisor.
+    Each replica lazily rebuilds advisors from their state, replaying only the observations it has not seen yet.
+    Updates of an advisor's state are serialized across replicas with a lock in cache.
+    '''
+    def __init__(self, cache=None):
+        if cache is None:
+            cache = Cache()
+
+        self._cache = cache
+        self._advisors = {} # Rebuilt advisors, as { <advisor_id>: (<advisor>, <generation ID>, <no. of observations replayed>) }
 
     def create_advisor(self, knob_config, advisor_id=None):
-        is_created = False
-        advisor = None
-
-        if advisor_id is not None:
-            advisor = self._get_advisor(advisor_id)
-            
-        if advisor is None:
-            advisor = Advisor(knob_config)
-            advisor_id = str(uuid.uuid4()) if advisor_id is None else advisor_id
-            self._advisors[advisor_id] = advisor
-            is_created = True
+        advisor_id = str(uuid.uuid4()) if advisor_id is None else advisor_id
+        is_created = self._cache.add_advisor(advisor_id, knob_config)
 
         return {
             'id': advisor_id,
@@ -35,13 +42,8 @@ class AdvisorService(object):
         }
 
     def delete_advisor(self, advisor_id):
-        is_deleted = False
-
-        advisor = self._get_advisor(advisor_id)
-
-        if advisor is not None:
-            del self._advisors[advisor_id]
-            is_deleted = True
+        is_deleted = self._cache.delete_advisor(advisor_id)
+        self._advisors.pop(advisor_id, None)
 
         return {
             'id': advisor_id,
@@ -50,31 +52,104 @@ class AdvisorService(object):
         }
 
     def generate_proposal(self, advisor_id):
-        advisor = self._get_advisor(advisor_id)
-        knobs = advisor.propose()
+        knobs_list = self._propose(advisor_id, 1)
 
         return {
-            'knobs': knobs
+            'knobs': knobs_list[0]
+        }
+
+    # Generates a batch of diverse proposals of knobs, for trials that run in parallel
+    def generate_proposals(self, advisor_id, count):
+        knobs_list = self._propose(advisor_id, int(count))
+
+        return {
+            'knobs_list': knobs_list
+        }
+
+    # Releases proposals of knobs that will not be tried, so that they are no longer pending
+    def release_proposals(self, advisor_id, knobs_list):
+        if self._get_advisor(advisor_id) is None:
+            raise InvalidAdvisorException()
+
+        self._cache.delete_pending_proposals_of_advisor(advisor_id, knobs_list)
+
+        return {
+            'id': advisor_id
         }
 
     # Feedbacks to the advisor on the score of a set of knobs
     # Additionally, returns another proposal of knobs after ingesting feedback
     def feedback(self, advisor_id, knobs, score):
-        advisor = self._get_advisor(advisor_id)
+        with self._lock_advisor(advisor_id):
+            if self._get_advisor(advisor_id) is None:
+                raise InvalidAdvisorException()
 
-        if advisor is None:
-            raise InvalidAdvisorException()
+            self._cache.add_observation_of_advisor(advisor_id, knobs, score)
+            self._cache.delete_pending_proposals_of_advisor(advisor_id, [knobs])
 
-        advisor.feedback(knobs, score)
-        knobs = advisor.propose()
+            # Replay the new observation, then propose
+            # This proposal is not kept pending, as callers may not try it
+            advisor = self._get_advisor(advisor_id)
+            knobs = advisor.propose()
 
         return {
             'knobs': knobs
         }
 
+    # Proposes knobs while accounting for pending proposals, then keeps the new proposals pending
+    # The advisor is locked throughout, so that concurrent proposals account for each other
+    def _propose(self, advisor_id, count):
+        with self._lock_advisor(advisor_id):
+            advisor = self._get_advisor(advisor_id)
+
+            if advisor is None:
+                raise InvalidAdvisorException()
+
+            pending_knobs_list = self._cache.get_pending_proposals_of_advisor(advisor_id, 
+                                                                            timeout=ADVISOR_PENDING_PROPOSAL_TIMEOUT)
+            knobs_list = advisor.propose_batch(count, pending_knobs_list)
+            self._cache.add_pending_proposals_of_advisor(advisor_id, knobs_list)
+
+        return knobs_list
+
+    # Locks the advisor's state across replicas for the duration of a `with` block
+    # Raises `AdvisorBusyException` if the lock cannot be acquired in time
+    @contextmanager
+    def _lock_advisor(self, advisor_id):
+        lock = self._cache.get_lock_of_advisor(advisor_id, timeout=ADVISOR_LOCK_TIMEOUT, 
+                                            blocking_timeout=ADVISOR_LOCK_TIMEOUT)
+        if not lock.acquire():
+            raise AdvisorBusyException()
+
+        try:
+            yield
+        finally:
+            try:
+                lock.release()
+            except LockError:
+                # Lock has expired, and may have been acquired by another replica
+                logger.warning('Lock of advisor of ID "{}" expired before it was released'.format(advisor_id))
+
+    # Returns the advisor, brought up to date with its state in cache, or None if it doesn't exist
     def _get_advisor(self, advisor_id):
-        if advisor_id not in self._advisors:
+        res = self._cache.get_advisor(advisor_id)
+
+        if res is None:
+            self._advisors.pop(advisor_id, None)
             return None
 
-        advisor = self._advisors[advisor_id]
+        (knob_config, generation_id) = res
+
+        # Rebuild the advisor if it has not been built, or if it has been deleted & recreated (maybe by other replicas)
+        if advisor_id not in self._advisors or self._advisors[advisor_id][1] != generation_id:
+            logger.info('Rebuilding advisor of ID "{}" from cache...'.format(advisor_id))
+            self._advisors[advisor_id] = (Advisor(knob_config), generation_id, 0)
+
+        # Replay observations made since the advisor was last brought up to date, possibly by other replicas
+        (advisor, _, observation_count) = self._advisors[advisor_id]
+        observations = self._cache.get_observations_of_advisor(advisor_id, start=observation_count)
+        for (knobs, score) in observations:
+            advisor.feedback(knobs, score)
+
+        self._advisors[advisor_id] = (advisor, generation_id, observation_count + len(observations))
         return advisor
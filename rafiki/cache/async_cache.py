@@ -0,0 +1,124 @@
+import aioredis
+import os
+import time
+
+from rafiki.config import CACHE_CODEC, CACHE_ASYNC_POOL_SIZE
+
+from .cache import RUNNING_INFERENCE_WORKERS, QUERIES_QUEUE, PREDICTIONS_QUEUE, get_blocking_timeout
+from .codec import make_codec, make_message, parse_message, decode_payload
+
+CACHED_PREDICTIONS = 'CACHED_PREDICTIONS'
+
+class AsyncCache(object):
+    '''
+    Cache with an asyncio Redis client, for the predictor's side of the queues
+    '''
+    def __init__(self,
+        host=os.environ.get('REDIS_HOST', 'localhost'),
+        port=os.environ.get('REDIS_PORT', 6379),
+        codec_type=CACHE_CODEC):
+
+        self._cache_connection_url = self._make_connection_url(
+            host=host,
+            port=port
+        )
+
+        self._codec = make_codec(codec_type)
+        self._redis = None
+        self._blocking_redis = None
+
+    async def connect(self):
+        self._redis = await aioredis.create_redis_pool(self._cache_connection_url,
+                                                        maxsize=CACHE_ASYNC_POOL_SIZE)
+
+        # Blocking commands get their own connection, so that they don't hold up other commands
+        self._blocking_redis = await aioredis.create_redis(self._cache_connection_url)
+
+    async def disconnect(self):
+        for redis in [self._redis, self._blocking_redis]:
+            if redis is not None:
+                redis.close()
+                await redis.wait_closed()
+
+        self._redis = None
+        self._blocking_redis = None
+
+    # If `heartbeat_timeout` (in seconds) is passed, excludes workers whose heartbeats have stopped for longer than it
+    async def get_workers_of_inference_job(self, inference_job_id, heartbeat_timeout=None):
+        inference_workers_key = '{}_{}'.format(RUNNING_INFERENCE_WORKERS, inference_job_id)
+        min_heartbeat = float('-inf') if heartbeat_timeout is None else time.time() - heartbeat_timeout
+        worker_ids = await self._redis.zrangebyscore(inference_workers_key, min=min_heartbeat, max=float('inf'))
+        return [x.decode() for x in worker_ids]
+
+    # Returns the number of batches of queries queued for each worker, in a single round trip
+    async def get_queue_lengths_of_workers(self, worker_ids):
+        pipe = self._redis.pipeline()
+        futures = [
+            pipe.llen('{}_{}'.format(QUERIES_QUEUE, worker_id))
+            for worker_id in worker_ids
+        ]
+        await pipe.execute()
+        return [await x for x in futures]
+
+    # Adds the same batch of queries to each worker as a single message, in a single round trip
+    # `worker_to_query_id` maps each worker to the ID of its message, and
+    # workers will push predictions to the reply key of `reply_id`
+    # If `deadline` (as a UNIX timestamp) is passed, workers drop the queries if they have not started on them by then
+    async def add_queries_of_workers(self, worker_to_query_id, queries, reply_id, deadline=None):
+        encoded_queries = self._codec.encode(queries)
+
+        pipe = self._redis.pipeline()
+        for (worker_id, query_id) in worker_to_query_id.items():
+            header = {
+                'id': query_id,
+                'reply_id': reply_id,
+                'deadline': deadline
+            }
+            worker_queries_key = '{}_{}'.format(QUERIES_QUEUE, worker_id)
+            pipe.rpush(worker_queries_key, make_message(header, encoded_queries))
+
+        await pipe.execute()
+
+    # Blocks until there are predictions at the reply key of `reply_id`, or until timeout (in seconds)
+    # Then atomically pops all of them
+    # Returns a list of (query_id, predictions)
+    async def pop_predictions(self, reply_id, timeout):
+        reply_predictions_key = '{}_{}'.format(PREDICTIONS_QUEUE, reply_id)
+        res = await self._blocking_redis.blpop(reply_predictions_key, timeout=get_blocking_timeout(timeout))
+
+        if res is None:
+            return []
+
+        (_, predictions) = res
+        predictions_list = [predictions]
+
+        # Pop the rest of the predictions in a single MULTI/EXEC
+        tr = self._blocking_redis.multi_exec()
+        more_predictions_list = tr.lrange(reply_predictions_key, 0, -1)
+        tr.delete(reply_predictions_key)
+        await tr.execute()
+        predictions_list.extend(await more_predictions_list)
+
+        messages = [parse_message(x) for x in predictions_list]
+        return [
+            (header['id'], predictions)
+            for (header, predictions) in messages
+        ]
+
+    # Returns the cached prediction of the query with hash `query_hash`, or None if there is none
+    async def get_cached_prediction(self, inference_job_id, query_hash):
+        cached_prediction_key = '{}_{}_{}'.format(CACHED_PREDICTIONS, inference_job_id, query_hash)
+        prediction = await self._redis.get(cached_prediction_key)
+
+        if prediction is None:
+            return None
+
+        return decode_payload(prediction)
+
+    # Caches the prediction of the query with hash `query_hash`, expiring after `ttl` (in seconds)
+    async def add_cached_prediction(self, inference_job_id, query_hash, prediction, ttl):
+        cached_prediction_key = '{}_{}_{}'.format(CACHED_PREDICTIONS, inference_job_id, query_hash)
+        await self._redis.set(cached_prediction_key, self._codec.encode(prediction), expire=ttl)
+
+    def _make_connection_url(self, host, port):
+        return 'redis://{}:{}'.format(host, port)
@@ -1,16 +1,30 @@
 import redis
 import os
+import math
+import time
 import json
 import uuid
+import logging
+
+from rafiki.config import CACHE_PREDICTION_TTL, CACHE_CODEC, ADVISOR_TTL
+
+from .codec import make_codec, make_message, parse_message
 
 RUNNING_INFERENCE_WORKERS = 'INFERENCE_WORKERS'
 QUERIES_QUEUE = 'QUERIES'
 PREDICTIONS_QUEUE = 'PREDICTIONS'
+ADVISOR = 'ADVISOR'
+ADVISOR_LOCK = 'ADVISOR_LOCK'
+ADVISOR_OBSERVATIONS = 'ADVISOR_OBSERVATIONS'
+ADVISOR_PENDING_PROPOSALS = 'ADVISOR_PENDING_PROPOSALS'
+
+logger = logging.getLogger(__name__)
 
 class Cache(object):
     def __init__(self,
         host=os.environ.get('REDIS_HOST', 'localhost'),
-        port=os.environ.get('REDIS_PORT', 6379)):
+        port=os.environ.get('REDIS_PORT', 6379),
+        codec_type=CACHE_CODEC):
 
         cache_connection_url = self._make_connection_url(
             host=host,
@@ -19,63 +33,174 @@ class Cache(object):
 
         self._connection_pool = redis.ConnectionPool.from_url(cache_connection_url)
         self._redis = redis.StrictRedis(connection_pool=self._connection_pool, decode_responses=True)
+        self._codec = make_codec(codec_type)
         
+    # Adds worker to the inference job's set of running workers, scored by the time of its latest heartbeat
+    # Workers should call this periodically as a heartbeat
     def add_worker_of_inference_job(self, worker_id, inference_job_id):
         inference_workers_key = '{}_{}'.format(RUNNING_INFERENCE_WORKERS, inference_job_id)
-        self._redis.sadd(inference_workers_key, worker_id)
+        self._redis.zadd(inference_workers_key, time.time(), worker_id)
 
     def delete_worker_of_inference_job(self, worker_id, inference_job_id):
         inference_workers_key = '{}_{}'.format(RUNNING_INFERENCE_WORKERS, inference_job_id)
-        self._redis.srem(inference_workers_key, worker_id)
+        self._redis.zrem(inference_workers_key, worker_id)
 
-    def get_workers_of_inference_job(self, inference_job_id):
-        inference_workers_key = '{}_{}'.format(RUNNING_INFERENCE_WORKERS, inference_job_id)
-        worker_ids = self._redis.smembers(inference_workers_key)
-        return [x.decode() for x in worker_ids]
+    # Atomically pops up to `batch_size` batches of queries for the worker
+    # If `timeout` (in seconds) is passed, blocks until there is at least 1 batch of queries for the worker, or until timeout 
+    # Batches of queries that are past their deadline are dropped
+    # Returns (query_ids, reply_ids, queries_list), where `queries_list` is a list of batches of queries
+    def pop_queries_of_worker(self, worker_id, batch_size, timeout=None):
+        worker_queries_key = '{}_{}'.format(QUERIES_QUEUE, worker_id)
+        queries_list = []
 
-    def add_query_of_worker(self, worker_id, query):
-        query_id = str(uuid.uuid4())
-        query = json.dumps({
-            'id': query_id,
-            'query': query
-        })
+        if timeout is not None:
+            res = self._redis.blpop([worker_queries_key], timeout=get_blocking_timeout(timeout))
 
-        worker_queries_key = '{}_{}'.format(QUERIES_QUEUE, worker_id)
-        self._redis.rpush(worker_queries_key, query)
-        return query_id
+            if res is None:
+                return ([], [], [])
 
-    def pop_queries_of_worker(self, worker_id, batch_size):
-        worker_queries_key = '{}_{}'.format(QUERIES_QUEUE, worker_id)
-        queries = self._redis.lrange(worker_queries_key, 0, batch_size - 1)
-        self._redis.ltrim(worker_queries_key, len(queries), -1)
-        queries = [json.loads(x) for x in queries]
-        query_ids = [x['id'] for x in queries]
-        queries = [x['query'] for x in queries]
-        return (query_ids, queries)
-
-    def add_prediction_of_worker(self, worker_id, query_id, prediction):
-        prediction = json.dumps({
+            (_, queries) = res
+            queries_list.append(queries)
+
+        # Pop the rest of the batch in a single MULTI/EXEC
+        if batch_size > len(queries_list):
+            pipe = self._redis.pipeline(transaction=True)
+            pipe.lrange(worker_queries_key, 0, batch_size - len(queries_list) - 1)
+            pipe.ltrim(worker_queries_key, batch_size - len(queries_list), -1)
+            (more_queries_list, _) = pipe.execute()
+            queries_list.extend(more_queries_list)
+
+        messages = [parse_message(x) for x in queries_list]
+
+        now = time.time()
+        live_messages = [(header, queries) for (header, queries) in messages 
+                        if header.get('deadline') is None or header['deadline'] > now]
+        if len(live_messages) < len(messages):
+            logger.warning('Dropped {} batches of queries past their deadline'.format(len(messages) - len(live_messages)))
+        messages = live_messages
+
+        query_ids = [header['id'] for (header, _) in messages]
+        reply_ids = [header['reply_id'] for (header, _) in messages]
+        queries_list = [queries for (_, queries) in messages]
+        return (query_ids, reply_ids, queries_list)
+
+    # Pushes predictions for a batch of queries to the reply key that the queries' predictor is waiting on
+    def add_predictions_of_worker(self, worker_id, query_id, reply_id, predictions):
+        header = {
             'id': query_id,
-            'prediction': prediction
+            'worker_id': worker_id
+        }
+        predictions = make_message(header, self._codec.encode(predictions))
+
+        # Expire the reply key so that predictions are not kept forever if their predictor has stopped
+        reply_predictions_key = '{}_{}'.format(PREDICTIONS_QUEUE, reply_id)
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.rpush(reply_predictions_key, predictions)
+        pipe.expire(reply_predictions_key, CACHE_PREDICTION_TTL)
+        pipe.execute()
+
+    # Saves the advisor's knob config, unless the advisor already exists
+    # Each advisor is saved with a new generation ID, so that replicas can tell an advisor from an earlier one of the same ID
+    # Returns whether the advisor has been added
+    def add_advisor(self, advisor_id, knob_config):
+        advisor_key = '{}_{}'.format(ADVISOR, advisor_id)
+        advisor = {
+            'knob_config': knob_config,
+            'generation_id': str(uuid.uuid4())
+        }
+        is_added = bool(self._redis.setnx(advisor_key, json.dumps(advisor)))
+
+        if is_added:
+            self._touch_advisor(advisor_id)
+
+        return is_added
+
+    # Returns (knob_config, generation_id) of the advisor, or None if the advisor doesn't exist
+    def get_advisor(self, advisor_id):
+        advisor_key = '{}_{}'.format(ADVISOR, advisor_id)
+        advisor = self._redis.get(advisor_key)
+        if advisor is None:
+            return None
+
+        advisor = json.loads(advisor.decode('utf-8'))
+        return (advisor['knob_config'], advisor['generation_id'])
+
+    # Deletes all of the advisor's state
+    # Returns whether the advisor existed
+    def delete_advisor(self, advisor_id):
+        return self._redis.delete(*self._get_advisor_keys(advisor_id)) > 0
+
+    # Returns a lock that serializes updates of the advisor's state across replicas
+    # The lock is released after `timeout` (in seconds) even if its holder has not, and 
+    # acquiring it gives up after `blocking_timeout` (in seconds)
+    def get_lock_of_advisor(self, advisor_id, timeout, blocking_timeout):
+        advisor_lock_key = '{}_{}'.format(ADVISOR_LOCK, advisor_id)
+        return self._redis.lock(advisor_lock_key, timeout=timeout, blocking_timeout=blocking_timeout)
+
+    def add_observation_of_advisor(self, advisor_id, knobs, score):
+        observations_key = '{}_{}'.format(ADVISOR_OBSERVATIONS, advisor_id)
+        self._redis.rpush(observations_key, json.dumps({ 'knobs': knobs, 'score': score }))
+        self._touch_advisor(advisor_id)
+
+    # Returns the advisor's observations from index `start` onwards, as a list of (knobs, score)
+    def get_observations_of_advisor(self, advisor_id, start=0):
+        observations_key = '{}_{}'.format(ADVISOR_OBSERVATIONS, advisor_id)
+        observations = [json.loads(x.decode('utf-8')) for x in self._redis.lrange(observations_key, start, -1)]
+        return [(x['knobs'], x['score']) for x in observations]
+
+    def add_pending_proposals_of_advisor(self, advisor_id, knobs_list):
+        if len(knobs_list) == 0:
+            return
+
+        pending_proposals_key = '{}_{}'.format(ADVISOR_PENDING_PROPOSALS, advisor_id)
+        self._redis.hmset(pending_proposals_key, {
+            _canonical_json(knobs): time.time()
+            for knobs in knobs_list
         })
+        self._touch_advisor(advisor_id)
+
+    def delete_pending_proposals_of_advisor(self, advisor_id, knobs_list):
+        if len(knobs_list) == 0:
+            return
+
+        pending_proposals_key = '{}_{}'.format(ADVISOR_PENDING_PROPOSALS, advisor_id)
+        self._redis.hdel(pending_proposals_key, *[_canonical_json(knobs) for knobs in knobs_list])
 
-        worker_predictions_key = '{}_{}'.format(PREDICTIONS_QUEUE, worker_id)
-        self._redis.rpush(worker_predictions_key, prediction)
+    # Returns the advisor's pending proposals of knobs, discarding those that have been pending for longer 
+    # than `timeout` (in seconds)
+    def get_pending_proposals_of_advisor(self, advisor_id, timeout):
+        pending_proposals_key = '{}_{}'.format(ADVISOR_PENDING_PROPOSALS, advisor_id)
+        knobs_to_time = self._redis.hgetall(pending_proposals_key)
 
-    def pop_prediction_of_worker(self, worker_id, query_id):
-        # Search through worker's list of predictions
-        worker_predictions_key = '{}_{}'.format(PREDICTIONS_QUEUE, worker_id)
-        predictions = self._redis.lrange(worker_predictions_key, 0, -1)
+        min_proposed_time = time.time() - timeout
+        expired_knobs = [x for (x, proposed_time) in knobs_to_time.items() if float(proposed_time) < min_proposed_time]
+        if len(expired_knobs) > 0:
+            self._redis.hdel(pending_proposals_key, *expired_knobs)
 
-        for (i, prediction) in enumerate(predictions):
-            prediction = json.loads(prediction)
-            # If prediction for query found, remove prediction from list and return it
-            if prediction['id'] == query_id:
-                self._redis.ltrim(worker_predictions_key, i + 1, i)
-                return prediction['prediction']
+        return [
+            json.loads(x.decode('utf-8')) 
+            for (x, proposed_time) in knobs_to_time.items() 
+            if float(proposed_time) >= min_proposed_time
+        ]
 
-        # Return None if prediction is not found
-        return None
+    # Expires all of the advisor's state after ADVISOR_TTL, so that advisors that are no longer used 
+    # (e.g. of crashed workers) are eventually discarded
+    def _touch_advisor(self, advisor_id):
+        pipe = self._redis.pipeline(transaction=True)
+        for key in self._get_advisor_keys(advisor_id):
+            pipe.expire(key, ADVISOR_TTL)
+        pipe.execute()
+
+    def _get_advisor_keys(self, advisor_id):
+        return ['{}_{}'.format(x, advisor_id) for x in [ADVISOR, ADVISOR_OBSERVATIONS, ADVISOR_PENDING_PROPOSALS]]
 
     def _make_connection_url(self, host, port):
         return 'redis://{}:{}'.format(host, port)
+
+# Serializes an object as JSON such that equal objects are serialized the same way
+def _canonical_json(obj):
+    return json.dumps(obj, sort_keys=True, separators=(',', ':'))
+
+def get_blocking_timeout(timeout):
+    # Redis only supports whole seconds for blocking timeouts, and a timeout of 0 blocks forever
+    return max(1, int(math.ceil(timeout)))
@@ -0,0 +1,151 @@
+import json
+import struct
+import numpy as np
+
+from rafiki.constants import CacheCodecType
+
+class InvalidCodecTypeException(Exception): pass
+class InvalidEncodedPayloadException(Exception): pass
+
+# Encoded payloads are prefixed with a tag of their codec, so that any codec can decode them
+_JSON_TAG = b'j'
+_MSGPACK_TAG = b'm'
+_NUMPY_TAG = b'n'
+
+# Numeric dtypes that the NumPy codec encodes as raw buffers
+_NUMPY_RAW_DTYPE_KINDS = 'biuf'
+
+class JsonCodec(object):
+    def encode(self, obj):
+        return _JSON_TAG + json.dumps(obj, default=simplify_numpy_value).encode('utf-8')
+
+    def decode(self, data):
+        return json.loads(bytes(data[1:]).decode('utf-8'))
+
+class MsgpackCodec(object):
+    '''
+    Requires the optional ``msgpack`` package
+    '''
+    def __init__(self):
+        import msgpack
+        self._msgpack = msgpack
+
+    def encode(self, obj):
+        return _MSGPACK_TAG + self._msgpack.packb(obj, use_bin_type=True, default=simplify_numpy_value)
+
+    def decode(self, data):
+        return self._msgpack.unpackb(bytes(data[1:]), raw=False)
+
+class NumpyCodec(object):
+    '''
+    Encodes numeric (possibly nested) lists or NumPy arrays as contiguous raw buffers, with a header of their dtype & shape.
+    Integers are encoded with the smallest dtype that holds their values (e.g. pixels as 1 byte each), and
+    are decoded back to their original dtype.
+    Other arrays are decoded as read-only NumPy arrays that share memory with the encoded data, without copying.
+    Other payloads (e.g. strings, lists of varying lengths) fall back to JSON.
+    '''
+    def __init__(self):
+        self._fallback_codec = JsonCodec()
+
+    def encode(self, obj):
+        arr = self._to_numeric_array(obj)
+        if arr is None:
+            return self._fallback_codec.encode(obj)
+
+        header = {
+            'dtype': arr.dtype.str,
+            'shape': arr.shape
+        }
+
+        if arr.dtype.kind in 'iu' and arr.size > 0:
+            encoded_dtype = np.result_type(np.min_scalar_type(arr.min()), np.min_scalar_type(arr.max()))
+            if encoded_dtype.itemsize < arr.dtype.itemsize:
+                header['encoded_dtype'] = encoded_dtype.str
+                arr = arr.astype(encoded_dtype)
+
+        arr = np.ascontiguousarray(arr)
+        header = json.dumps(header).encode('utf-8')
+
+        return b''.join([_NUMPY_TAG, struct.pack('<I', len(header)), header, arr.tobytes()])
+
+    def decode(self, data):
+        if bytes(data[0:1]) != _NUMPY_TAG:
+            return self._fallback_codec.decode(data)
+
+        data = memoryview(data)
+        (header_len,) = struct.unpack_from('<I', data, 1)
+        offset = 1 + 4 + header_len
+        header = json.loads(bytes(data[5:offset]).decode('utf-8'))
+        dtype = np.dtype(header['dtype'])
+        arr = np.frombuffer(data, dtype=np.dtype(header.get('encoded_dtype', dtype)), offset=offset)
+        arr = arr.reshape(header['shape'])
+
+        if arr.dtype != dtype:
+            arr = arr.astype(dtype)
+
+        return arr
+
+    def _to_numeric_array(self, obj):
+        if not isinstance(obj, (list, tuple, np.ndarray)):
+            return None
+
+        try:
+            arr = np.asarray(obj)
+        except ValueError:
+            return None
+
+        if arr.dtype.kind not in _NUMPY_RAW_DTYPE_KINDS:
+            return None
+
+        return arr
+
+def make_codec(codec_type):
+    if codec_type == CacheCodecType.JSON:
+        return JsonCodec()
+    elif codec_type == CacheCodecType.MSGPACK:
+        return MsgpackCodec()
+    elif codec_type == CacheCodecType.NUMPY:
+        return NumpyCodec()
+    else:
+        raise InvalidCodecTypeException()
+
+_TAG_TO_CODEC_TYPE = {
+    _JSON_TAG: CacheCodecType.JSON,
+    _MSGPACK_TAG: CacheCodecType.MSGPACK,
+    _NUMPY_TAG: CacheCodecType.NUMPY
+}
+
+_tag_to_codec = {}
+
+# Decodes a payload encoded by any of the codecs
+def decode_payload(data):
+    tag = bytes(data[0:1])
+    if tag not in _TAG_TO_CODEC_TYPE:
+        raise InvalidEncodedPayloadException()
+
+    if tag not in _tag_to_codec:
+        _tag_to_codec[tag] = make_codec(_TAG_TO_CODEC_TYPE[tag])
+
+    return _tag_to_codec[tag].decode(data)
+
+# A message is a length-prefixed JSON header, followed by its payload as encoded by a codec
+def make_message(header, encoded_payload):
+    header = json.dumps(header).encode('utf-8')
+    return b''.join([struct.pack('<I', len(header)), header, encoded_payload])
+
+# Returns (header, payload)
+def parse_message(message):
+    message = memoryview(message)
+    (header_len,) = struct.unpack_from('<I', message, 0)
+    header = json.loads(bytes(message[4:(4 + header_len)]).decode('utf-8'))
+    payload = decode_payload(message[(4 + header_len):])
+    return (header, payload)
+
+# Converts NumPy values to their Python equivalents, as the `default` of serializers (e.g. `json.dumps`)
+def simplify_numpy_value(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    elif isinstance(value, np.generic):
+        return value.item()
+
+    raise TypeError('{} is not serializable'.format(type(value)))
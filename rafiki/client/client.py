@@ -301,7 +301,7 @@ class Client(object):
     # Inference Jobs
     ####################################
 
-    def create_inference_job(self, app, app_version=-1):
+    def create_inference_job(self, app, app_version=-1, slo=None):
         '''
         Creates and starts a inference job on Rafiki with the 2 best trials of an associated train job of the app. 
         The train job must have the status of ``COMPLETED``.The inference job would be tagged with the train job's app and app version. 
@@ -313,10 +313,13 @@ class Client(object):
 
         :param str app: Name of the app identifying the train job to use
         :param str app_version: Version of the app identifying the train job to use
+        :param float slo: Latency SLO (in seconds) of predictions. Predictions are ensembled only from workers that respond within it. 
+            If not specified, a default SLO is used
         '''
         data = self._post('/inference_jobs', json={
             'app': app,
-            'app_version': app_version
+            'app_version': app_version,
+            'slo': slo
         })
         return data
 
@@ -391,6 +394,35 @@ class Client(object):
         data = self._post('/advisors/{}/propose'.format(advisor_id), target='advisor')
         return data
 
+    def generate_proposals(self, advisor_id, count):
+        '''
+        Generate a batch of diverse proposals of knobs from an advisor, for trials that run in parallel.
+        Proposals are considered pending until they are fed back with :meth:`rafiki.client.Client.feedback_to_advisor`,
+        or released with :meth:`rafiki.client.Client.release_proposals`.
+
+        :param str advisor_id: ID of target advisor
+        :param int count: Number of proposals to generate
+        :returns: List of knobs as `dict[<knob_name>, <knob_value>]`
+        '''
+        data = self._post('/advisors/{}/propose_batch'.format(advisor_id), 
+                        target='advisor', json={
+                            'count': count
+                        })
+        return data
+
+    def release_proposals(self, advisor_id, knobs_list):
+        '''
+        Releases proposals of knobs from an advisor that will not be tried, so that they are no longer pending.
+
+        :param str advisor_id: ID of target advisor
+        :param knobs_list: List of knobs as `dict[<knob_name>, <knob_value>]` that will not be tried
+        '''
+        data = self._post('/advisors/{}/release'.format(advisor_id), 
+                        target='advisor', json={
+                            'knobs_list': knobs_list
+                        })
+        return data
+
     def feedback_to_advisor(self, advisor_id, knobs, score):
         '''
         Feedbacks to the advisor on the score of a set of knobs.
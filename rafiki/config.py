@@ -6,6 +6,10 @@ APP_MODE = 'DEV' # DEV or PROD
 SUPERADMIN_EMAIL = 'superadmin@rafiki'
 SUPERADMIN_PASSWORD = 'rafiki'
 LOGS_FOLDER_PATH = os.path.join(os.getcwd(), 'logs')
+ARTIFACT_STORE_FOLDER_PATH = os.path.join(os.getcwd(), 'artifacts') # Folder of stored artifacts (e.g. trials' parameters) on the work directory
+ARTIFACT_STORE_CHUNK_SIZE = 1024 * 1024 # Size (in bytes) of chunks that artifacts are read & written in
+MODEL_CACHE_FOLDER_PATH = os.path.join(os.getcwd(), 'model_cache') # Folder of trials' cached models on the work directory
+MODEL_CACHE_MAX_COUNT = 50 # Max no. of trials' models kept in the model cache
 
 # Admin
 MIN_SERVICE_PORT = 30000
@@ -15,9 +19,40 @@ TRAIN_WORKER_REPLICAS_PER_MODEL = 2
 INFERENCE_WORKER_REPLICAS_PER_TRIAL = 2
 INFERENCE_MAX_BEST_TRIALS = 2
 
+# Database
+DB_POOL_SIZE = 5 # No. of connections kept open in each process's pool of DB connections
+DB_POOL_MAX_OVERFLOW = 10 # Max no. of connections opened beyond the pool's size under load
+DB_POOL_RECYCLE = 1800 # Time (in seconds) after which pooled DB connections are replaced
+DB_POOL_PRE_PING = True # Whether pooled DB connections are checked to be alive before use
+
+# Cache
+CACHE_CODEC = 'NUMPY' # Codec of queries & predictions in cache (see `rafiki.constants.CacheCodecType`)
+CACHE_PREDICTION_TTL = 60 # Time (in seconds) before unclaimed predictions are discarded
+CACHE_ASYNC_POOL_SIZE = 10 # Max no. of connections in each predictor's pool of Redis connections
+
 # Predictor
-PREDICTOR_PREDICT_SLEEP = 0.25
+PREDICTOR_DEFAULT_SLO = 10 # Max time (in seconds) to wait for workers' predictions, if inference job has no SLO
+PREDICTOR_ENSEMBLE_METHOD = None # How workers' predictions are ensembled (see `rafiki.constants.EnsembleMethod`), or None for the task's default (also used by tasks that don't support the method)
+PREDICTOR_WORKERS_REFRESH_INTERVAL = 2 # Time (in seconds) before the predictor refreshes its set of running workers
+PREDICTOR_MAX_QUEUE_DEPTH = 100 # Max no. of batches of queries queued for a worker, beyond which it is sent no more queries
+PREDICTOR_RETRY_AFTER = 1 # Time (in seconds) that clients are asked to wait before retrying queries rejected due to overload
+PREDICTOR_CACHE_ENABLED = False # Whether predictions of repeated queries are served from a cache
+PREDICTOR_CACHE_SIZE = 1024 # Max no. of predictions in each predictor's in-process cache
+PREDICTOR_CACHE_TTL = 300 # Time (in seconds) before predictions in the shared Redis cache expire
+
+# Advisor
+ADVISOR_PENDING_PROPOSAL_TIMEOUT = 3600 # Time (in seconds) after which proposals without feedback are no longer considered pending
+ADVISOR_TTL = 7 * 24 * 3600 # Time (in seconds) since an advisor was last updated before its state is discarded
+ADVISOR_LOCK_TIMEOUT = 30 # Max time (in seconds) that an advisor's state is locked for while proposing
+
+# Train worker
+TRAIN_WORKER_CONCURRENT_TRIALS = 1 # No. of trials that each train worker runs concurrently in a pool of processes
+TRAIN_WORKER_BUDGET_WAIT = 5 # Time (in seconds) to wait when the budget is taken up by running trials of other workers
 
 # Inference worker
-INFERENCE_WORKER_SLEEP = 0.25
-INFERENCE_WORKER_PREDICT_BATCH_SIZE = 32
\ No newline at end of file
+INFERENCE_WORKER_POP_TIMEOUT = 1 # Max time (in seconds) to block while waiting for queries
+INFERENCE_WORKER_HEARTBEAT_INTERVAL = 2 # Time (in seconds) between heartbeats of a worker
+INFERENCE_WORKER_HEARTBEAT_TIMEOUT = 10 # Time (in seconds) without heartbeats before a worker is considered dead
+INFERENCE_WORKER_PREDICT_BATCH_SIZE = 256 # Upper bound of the adaptive batch size
+INFERENCE_WORKER_PREDICT_SLO = 0.1 # Target latency (in seconds) of predicting a batch
+INFERENCE_WORKER_BATCH_WINDOW = 0.005 # Max time (in seconds) to wait for a batch to fill up
\ No newline at end of file
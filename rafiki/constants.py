@@ -45,6 +45,17 @@ class UserType():
     APP_DEVELOPER = 'APP_DEVELOPER'
     USER = 'USER'
 
+class CacheCodecType():
+    JSON = 'JSON'
+    MSGPACK = 'MSGPACK'
+    NUMPY = 'NUMPY'
+
+class EnsembleMethod():
+    MEAN = 'MEAN'
+    WEIGHTED_MEAN = 'WEIGHTED_MEAN'
+    MAJORITY_VOTE = 'MAJORITY_VOTE'
+    MEDIAN = 'MEDIAN'
+
 class AdvisorType():
     BTB_GP = 'BTB_GP'
 
@@ -1 +1 @@
-from .database import Database
+from .database import Database, dispose_inherited_engines
@@ -1,21 +1,35 @@
 import datetime
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import threading
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker, scoped_session, undefer
 
 from rafiki.constants import TrainJobStatus, \
     TrialStatus, ServiceStatus, InferenceJobStatus
+from rafiki.config import DB_POOL_SIZE, DB_POOL_MAX_OVERFLOW, DB_POOL_RECYCLE, DB_POOL_PRE_PING
 
 from .schema import Base, TrainJob, TrainJobWorker, \
     InferenceJob, Trial, Model, User, Service, InferenceJobWorker
 
+# Engines & their session registries, shared by all `Database` instances of the process, keyed by (connection URL, read-only)
+_engines = {}
+_engines_lock = threading.Lock()
+
+# Pools inherited from a parent process, kept referenced so that their connections are never closed by the child
+_inherited_pools = []
+
 class Database(object):
+    '''
+    Sessions are scoped per thread, and are bound to pooled engines that are shared across the process.
+    Listing queries go through a separate read-only pool to a read replica if ``POSTGRES_READ_HOST`` is set.
+    '''
     def __init__(self, 
         host=os.environ.get('POSTGRES_HOST', 'localhost'), 
         port=os.environ.get('POSTGRES_PORT', 5432),
         user=os.environ.get('POSTGRES_USER', 'rafiki'),
         db=os.environ.get('POSTGRES_DB', 'rafiki'),
-        password=os.environ.get('POSTGRES_PASSWORD', 'rafiki')):
+        password=os.environ.get('POSTGRES_PASSWORD', 'rafiki'),
+        read_host=os.environ.get('POSTGRES_READ_HOST')):
 
         db_connection_url = self._make_connection_url(
             host=host, 
@@ -25,10 +39,23 @@ class Database(object):
             password=password
         )
 
-        self._engine = create_engine(db_connection_url)
-        self._Session = sessionmaker(bind=self._engine)
+        (self._engine, self._Session) = _get_engine(db_connection_url, read_only=False)
+
+        # Without a read replica, reads share the pool & sessions of writes, to not double connections to the DB
+        if not read_host:
+            (self._read_engine, self._ReadSession) = (self._engine, self._Session)
+        else:
+            read_db_connection_url = self._make_connection_url(
+                host=read_host, 
+                port=port, 
+                db=db,
+                user=user, 
+                password=password
+            )
+            (self._read_engine, self._ReadSession) = _get_engine(read_db_connection_url, read_only=True)
+
         self._session = None
-        self._define_tables()
+        self._read_session = None
 
     ####################################
     # Users
@@ -136,14 +163,23 @@ class Database(object):
             .filter(TrainJobWorker.train_job_id == train_job_id).all()
         return workers
 
+    # Returns a list of (worker, service, model) for the train job's workers, in a single query
+    def get_workers_with_services_of_train_job(self, train_job_id):
+        rows = self._session.query(TrainJobWorker, Service, Model) \
+            .join(Service, TrainJobWorker.service_id == Service.id) \
+            .join(Model, TrainJobWorker.model_id == Model.id) \
+            .filter(TrainJobWorker.train_job_id == train_job_id).all()
+        return rows
+
     ####################################
     # Inference Jobs
     ####################################
     
-    def create_inference_job(self, user_id, train_job_id):
+    def create_inference_job(self, user_id, train_job_id, slo=None):
         inference_job = InferenceJob(
             user_id=user_id,
-            train_job_id=train_job_id
+            train_job_id=train_job_id,
+            slo=slo
         )
         self._session.add(inference_job)
         return inference_job
@@ -164,11 +200,20 @@ class Database(object):
         return inference_job
 
     def get_inference_jobs_by_user(self, user_id):
-        inference_jobs = self._session.query(InferenceJob) \
+        inference_jobs = self._read_session.query(InferenceJob) \
             .filter(InferenceJob.user_id == user_id).all()
 
         return inference_jobs
 
+    # Returns a list of (inference_job, train_job, predictor_service) for the user's inference jobs, in a single query
+    def get_inference_jobs_with_train_jobs_by_user(self, user_id):
+        rows = self._read_session.query(InferenceJob, TrainJob, Service) \
+            .join(TrainJob, InferenceJob.train_job_id == TrainJob.id) \
+            .outerjoin(Service, InferenceJob.predictor_service_id == Service.id) \
+            .filter(InferenceJob.user_id == user_id).all()
+
+        return rows
+
     def update_inference_job(self, inference_job, predictor_service_id):
         inference_job.predictor_service_id = predictor_service_id
         self._session.add(inference_job)
@@ -192,13 +237,23 @@ class Database(object):
         return inference_job
 
     def get_inference_jobs_of_app(self, app):
-        inference_jobs = self._session.query(InferenceJob) \
+        inference_jobs = self._read_session.query(InferenceJob) \
             .join(TrainJob, InferenceJob.train_job_id == TrainJob.id) \
             .filter(TrainJob.app == app) \
             .order_by(InferenceJob.datetime_started.desc()).all()
 
         return inference_jobs
 
+    # Returns a list of (inference_job, train_job, predictor_service) for the app's inference jobs, in a single query
+    def get_inference_jobs_with_train_jobs_of_app(self, app):
+        rows = self._read_session.query(InferenceJob, TrainJob, Service) \
+            .join(TrainJob, InferenceJob.train_job_id == TrainJob.id) \
+            .outerjoin(Service, InferenceJob.predictor_service_id == Service.id) \
+            .filter(TrainJob.app == app) \
+            .order_by(InferenceJob.datetime_started.desc()).all()
+
+        return rows
+
     def get_workers_of_inference_job(self, inference_job_id):
         workers = self._session.query(InferenceJobWorker) \
             .filter(InferenceJobWorker.inference_job_id == inference_job_id).all()
@@ -221,6 +276,15 @@ class Database(object):
         inference_job_worker = self._session.query(InferenceJobWorker).get(service_id)
         return inference_job_worker
 
+    # Returns a list of (worker, service, trial, model) for the inference job's workers, in a single query
+    def get_workers_with_services_of_inference_job(self, inference_job_id):
+        rows = self._session.query(InferenceJobWorker, Service, Trial, Model) \
+            .join(Service, InferenceJobWorker.service_id == Service.id) \
+            .join(Trial, InferenceJobWorker.trial_id == Trial.id) \
+            .join(Model, Trial.model_id == Model.id) \
+            .filter(InferenceJobWorker.inference_job_id == inference_job_id).all()
+        return rows
+
     def get_workers_of_inference_job(self, inference_job_id):
         workers = self._session.query(InferenceJobWorker) \
             .filter(InferenceJobWorker.inference_job_id == inference_job_id).all()
@@ -306,12 +370,17 @@ class Database(object):
 
         return models
 
-    def get_model(self, id):
-        model = self._session.query(Model).get(id)
+    # Pass `with_model_file=True` to also load the model's file in the same query
+    def get_model(self, id, with_model_file=False):
+        query = self._session.query(Model)
+        if with_model_file:
+            query = query.options(undefer(Model.model_file_bytes))
+
+        model = query.get(id)
         return model
 
     def get_models(self):
-        return self._session.query(Model).all()
+        return self._read_session.query(Model).all()
 
     ####################################
     # Trials
@@ -327,14 +396,48 @@ class Database(object):
         self._session.add(trial)
         return trial
 
-    def get_trial(self, id):
-        trial = self._session.query(Trial) \
+    # Pass `with_logs=True` to also load the trial's logs in the same query
+    def get_trial(self, id, with_logs=False):
+        query = self._session.query(Trial)
+        if with_logs:
+            query = query.options(undefer(Trial.logs))
+
+        trial = query \
             .join(TrainJob, Trial.train_job_id == TrainJob.id) \
             .filter(Trial.id == id) \
             .first()
 
         return trial
 
+    # Returns (trial, model), in a single query
+    def get_trial_with_model(self, id):
+        row = self._session.query(Trial, Model) \
+            .join(Model, Trial.model_id == Model.id) \
+            .filter(Trial.id == id) \
+            .first()
+
+        return row if row is not None else (None, None)
+
+    # Returns a list of (trial, model) for the train job's best trials, in a single query
+    def get_best_trials_with_models_of_train_job(self, train_job_id, max_count=3):
+        rows = self._read_session.query(Trial, Model) \
+            .join(Model, Trial.model_id == Model.id) \
+            .filter(Trial.train_job_id == train_job_id) \
+            .filter(Trial.status == TrainJobStatus.COMPLETED) \
+            .order_by(Trial.score.desc()) \
+            .limit(max_count).all()
+
+        return rows
+
+    # Returns a list of (trial, model) for the train job's trials, in a single query
+    def get_trials_with_models_of_train_job(self, train_job_id):
+        rows = self._read_session.query(Trial, Model) \
+            .join(Model, Trial.model_id == Model.id) \
+            .filter(Trial.train_job_id == train_job_id) \
+            .order_by(Trial.datetime_started.desc()).all()
+
+        return rows
+
     def get_best_trials_of_train_job(self, train_job_id, max_count=3):
         trials = self._session.query(Trial) \
             .filter(Trial.train_job_id == train_job_id) \
@@ -345,7 +448,7 @@ class Database(object):
         return trials
 
     def get_trials_of_app(self, app):
-        trials = self._session.query(Trial) \
+        trials = self._read_session.query(Trial) \
             .join(TrainJob, Trial.train_job_id == TrainJob.id) \
             .filter(TrainJob.app == app) \
             .order_by(Trial.datetime_started.desc())
@@ -353,24 +456,56 @@ class Database(object):
         return trials
 
     def get_trials_of_train_job(self, train_job_id):
-        trials = self._session.query(Trial) \
+        trials = self._read_session.query(Trial) \
             .join(TrainJob, Trial.train_job_id == TrainJob.id) \
             .filter(TrainJob.id == train_job_id) \
             .order_by(Trial.datetime_started.desc()).all()
 
         return trials
 
+    # Atomically creates a trial for each set of knobs, but only as many as the model's trial count budget 
+    # `max_trials` allows, counting trials of the model that are running, completed or errored
+    # The train job's row stays locked until the session commits, so callers should commit right after
+    # Returns the created trials
+    def create_trials_within_budget(self, model_id, train_job_id, knobs_list, max_trials):
+        # Serialize budget checks across workers of the train job
+        self._session.query(TrainJob) \
+            .filter(TrainJob.id == train_job_id) \
+            .with_for_update() \
+            .one()
+
+        trial_count = self.count_trials_of_train_job(train_job_id, model_id,
+            statuses=[TrialStatus.RUNNING, TrialStatus.COMPLETED, TrialStatus.ERRORED])
+
+        trials = [
+            self.create_trial(model_id=model_id, train_job_id=train_job_id, knobs=knobs)
+            for knobs in knobs_list[:max(0, max_trials - trial_count)]
+        ]
+        self._session.flush()
+        return trials
+
+    # Counts trials of the model in the train job with any of the statuses, in a single COUNT query
+    def count_trials_of_train_job(self, train_job_id, model_id, statuses):
+        count = self._session.query(func.count(Trial.id)) \
+            .filter(Trial.train_job_id == train_job_id) \
+            .filter(Trial.model_id == model_id) \
+            .filter(Trial.status.in_(statuses)) \
+            .scalar()
+
+        return count
+
     def mark_trial_as_errored(self, trial):
         trial.status = TrialStatus.ERRORED
         trial.datetime_stopped = datetime.datetime.utcnow()
         self._session.add(trial)
         return trial
 
-    def mark_trial_as_complete(self, trial, score, parameters, logs):
+    def mark_trial_as_complete(self, trial, score, parameters_uri, parameters_checksum, logs):
         trial.status = TrialStatus.COMPLETED
         trial.score = score
         trial.datetime_stopped = datetime.datetime.utcnow()
-        trial.parameters = parameters
+        trial.parameters_uri = parameters_uri
+        trial.parameters_checksum = parameters_checksum
         trial.logs = logs
         self._session.add(trial)
         return trial
@@ -390,6 +525,7 @@ class Database(object):
 
     def connect(self):
         self._session = self._Session()
+        self._read_session = self._ReadSession()
 
     def __exit__(self, exception_type, exception_value, traceback):
         self.disconnect()
@@ -404,8 +540,16 @@ class Database(object):
     def disconnect(self):
         if self._session is not None:
             self._session.commit()
-            self._session.close()
+            self._Session.remove()
             self._session = None
+
+        if self._read_session is not None:
+            self._ReadSession.remove()
+            self._read_session = None
+
+    # Creates the tables of the schema if they don't exist, as a one-time step before the DB is used
+    def create_tables(self):
+        Base.metadata.create_all(bind=self._engine)
             
     def clear_all_data(self):
         for table in reversed(Base.metadata.sorted_tables):
@@ -416,7 +560,33 @@ class Database(object):
             user, password, host, port, db
         )
 
-    def _define_tables(self):
-        Base.metadata.create_all(bind=self._engine)
-        
-
+# Returns (engine, scoped session registry) for the connection URL, creating them once per process
+def _get_engine(db_connection_url, read_only):
+    with _engines_lock:
+        key = (db_connection_url, read_only)
+        if key not in _engines:
+            connect_args = {}
+            if read_only:
+                connect_args['options'] = '-c default_transaction_read_only=on'
+
+            engine = create_engine(db_connection_url, 
+                                pool_size=DB_POOL_SIZE,
+                                max_overflow=DB_POOL_MAX_OVERFLOW,
+                                pool_recycle=DB_POOL_RECYCLE,
+                                pool_pre_ping=DB_POOL_PRE_PING,
+                                connect_args=connect_args)
+            _engines[key] = (engine, scoped_session(sessionmaker(bind=engine)))
+
+        return _engines[key]
+
+# Gives the engines of a forked child process new pools & sessions, so that the child never uses the
+# connections of its parent process
+# Unlike `Engine.dispose()`, inherited connections are left open, as closing them would close the parent's
+# Not locked, as the lock may have been held by another thread of the parent when it forked
+def dispose_inherited_engines():
+    for (engine, Session) in _engines.values():
+        _inherited_pools.append(engine.pool)
+        engine.pool = engine.pool.recreate()
+
+        # Drop the session inherited from the forking thread without closing it
+        Session.registry.clear()
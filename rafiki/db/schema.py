@@ -1,5 +1,6 @@
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, String, Float, ForeignKey, Integer, Binary, DateTime
+from sqlalchemy import Column, String, Float, ForeignKey, Integer, Binary, DateTime, Index
+from sqlalchemy.orm import deferred
 from sqlalchemy.dialects.postgresql import JSON
 import uuid
 import datetime
@@ -24,6 +25,7 @@ class InferenceJob(Base):
     status = Column(String, nullable=False, default=InferenceJobStatus.STARTED)
     user_id = Column(String, ForeignKey('user.id'), nullable=False)
     predictor_service_id = Column(String, ForeignKey('service.id'))
+    slo = Column(Float, default=None)
     datetime_stopped = Column(DateTime, default=None)
 
 class InferenceJobWorker(Base):
@@ -40,7 +42,7 @@ class Model(Base):
     datetime_created = Column(DateTime, nullable=False, default=generate_datetime)
     name = Column(String, unique=True, nullable=False)
     task = Column(String, nullable=False)
-    model_file_bytes = Column(Binary, nullable=False)
+    model_file_bytes = deferred(Column(Binary, nullable=False)) # Only loaded when accessed, or when undeferred in query
     model_class = Column(String, nullable=False)
     user_id = Column(String, ForeignKey('user.id'), nullable=False)
     docker_image = Column(String, nullable=False)
@@ -98,10 +100,18 @@ class Trial(Base):
     model_id = Column(String, ForeignKey('model.id'), nullable=False)
     status = Column(String, nullable=False, default=TrialStatus.RUNNING)
     score = Column(Float, default=0)
-    parameters = Column(Binary, default=None)
-    logs = Column(Binary, default=None)
+    parameters_uri = Column(String, default=None) # URI of trial's pickled parameters in artifact store
+    parameters_checksum = Column(String, default=None) # SHA-256 checksum of trial's pickled parameters
+    logs = deferred(Column(Binary, default=None)) # Only loaded when accessed, or when undeferred in query
     datetime_stopped = Column(DateTime, default=None)
 
+    __table_args__ = (
+        # For counting trials of a model in a train job by status
+        Index('ix_trial_train_job_id_model_id_status', 'train_job_id', 'model_id', 'status'),
+        # For finding the best trials of a train job
+        Index('ix_trial_train_job_id_score', 'train_job_id', 'score'),
+    )
+
 class User(Base):
     __tablename__ = 'user'
 
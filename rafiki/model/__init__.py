@@ -1,4 +1,4 @@
-from .model import BaseModel, test_model_class, load_model_class, \
+from .model import BaseModel, test_model_class, load_model_class, load_model_class_from_file, \
     parse_model_install_command, InvalidModelClassException, InvalidModelParamsException, \
     ModelUtils
 from .log import ModelLogUtilsLogger
@@ -3,8 +3,13 @@ import json
 import abc
 import traceback
 import pickle
-import uuid
-from importlib import import_module
+import sys
+import atexit
+import shutil
+import hashlib
+import tempfile
+import threading
+import importlib.util
 
 from rafiki.advisor import Advisor, AdvisorType
 from rafiki.predictor import ensemble_predictions
@@ -104,7 +109,8 @@ class BaseModel(abc.ABC):
         Each prediction should be JSON serializable.
         This will be called only when model is *trained*.
 
-        :param queries: List of queries, where a query is in a format specified by the task 
+        :param queries: List of queries, where a query is in a format specified by the task. 
+            Queries of numbers may be passed as a NumPy array instead
         :type queries: list[any]
         :returns: List of predictions, where a prediction is in a format specified by the task 
         :rtype: list[any]
@@ -212,7 +218,7 @@ def test_model_class(model_file_path, model_class, task, dependencies, \
             raise Exception('`dump_parameters()` should return a dict[str, any]')
 
         try:
-            # Model parameters are pickled and put into DB
+            # Model parameters are pickled and put into artifact store
             parameters = pickle.loads(pickle.dumps(parameters))
         except Exception:
             traceback.print_stack()
@@ -246,26 +252,67 @@ def test_model_class(model_file_path, model_class, task, dependencies, \
     except Exception as e:
         raise InvalidModelClassException(e)
 
+# Modules of loaded model files, keyed by hash of the model files' contents
+_model_modules = {}
+_model_modules_lock = threading.Lock()
+_model_modules_folder_path = None
+
+# Loads the model class from the model file
+# Model files with the same contents are only imported once per process, and the same class is returned for them
 def load_model_class(model_file_bytes, model_class):
-    temp_mod_name = str(uuid.uuid4())
-    temp_model_file_name ='{}.py'.format(temp_mod_name)
+    model_file_hash = hashlib.sha256(model_file_bytes).hexdigest()
+    mod = _get_model_module(model_file_hash, 
+                            lambda: _import_model_module(_save_model_file(model_file_bytes, model_file_hash), model_file_hash))
+
+    # Extract model class from module
+    return getattr(mod, model_class)
+
+# Loads the model class from a model file saved at `model_file_path`, whose contents have the SHA-256 hash `model_file_hash`
+# The model file is imported from where it is saved, and shares the modules of `load_model_class`
+def load_model_class_from_file(model_file_path, model_file_hash, model_class):
+    mod = _get_model_module(model_file_hash, lambda: _import_model_module(model_file_path, model_file_hash))
+
+    # Extract model class from module
+    return getattr(mod, model_class)
+
+def _get_model_module(model_file_hash, import_model_module):
+    with _model_modules_lock:
+        mod = _model_modules.get(model_file_hash)
+        if mod is None:
+            mod = import_model_module()
+            _model_modules[model_file_hash] = mod
+
+    return mod
 
-    # Temporarily save the model file to disk
-    with open(temp_model_file_name, 'wb') as f:
+# Returns the path of the model file saved to a private temp folder, which is removed on exit
+def _save_model_file(model_file_bytes, model_file_hash):
+    global _model_modules_folder_path
+
+    if _model_modules_folder_path is None:
+        _model_modules_folder_path = tempfile.mkdtemp(prefix='rafiki_models_')
+        atexit.register(shutil.rmtree, _model_modules_folder_path, ignore_errors=True)
+
+    model_file_path = os.path.join(_model_modules_folder_path, 'rafiki_model_{}.py'.format(model_file_hash))
+    with open(model_file_path, 'wb') as f:
         f.write(model_file_bytes)
 
+    return model_file_path
+
+def _import_model_module(model_file_path, model_file_hash):
+    mod_name = 'rafiki_model_{}'.format(model_file_hash)
+
+    # Import model file as module, registering it so that the model's classes can be pickled
+    spec = importlib.util.spec_from_file_location(mod_name, model_file_path)
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules[mod_name] = mod
     try:
-        # Import model file as module
-        mod = import_module(temp_mod_name)
-        # Extract model class from module
-        clazz = getattr(mod, model_class)
-    except Exception as e:
-        raise e
-    finally:
-        # Ensure that temp model file is removed upon model loading error
-        os.remove(temp_model_file_name)
+        spec.loader.exec_module(mod)
+    except Exception:
+        # Ensure that a partially imported model module is not kept
+        del sys.modules[mod_name]
+        raise
 
-    return clazz
+    return mod
 
 def parse_model_install_command(dependencies, enable_gpu=False):
     commands = []
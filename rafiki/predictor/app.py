@@ -1,30 +1,63 @@
 import os
-from flask import Flask, jsonify, request, g
-import threading
+import json
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse
 
-from .predictor import Predictor
+from rafiki.config import PREDICTOR_RETRY_AFTER
+from rafiki.cache.codec import simplify_numpy_value
+
+from .predictor import Predictor, PredictorOverloadedException
 
 service_id = os.environ['RAFIKI_SERVICE_ID']
 
-app = Flask(__name__)
+# Predictions are kept as NumPy arrays until they are sent in responses
+class PredictionsJSONResponse(JSONResponse):
+    def render(self, content):
+        return json.dumps(content, default=simplify_numpy_value).encode('utf-8')
 
-def get_predictor():
-    if not hasattr(g, 'predictor'):
-        g.predictor = Predictor(service_id)
-        g.predictor.start()
-    
-    return g.predictor
+app = Starlette()
+
+# A single predictor is shared by all requests of the process
+predictor = Predictor(service_id)
+
+@app.on_event('startup')
+async def startup():
+    await predictor.start()
+
+@app.on_event('shutdown')
+async def shutdown():
+    await predictor.stop()
+
+# Reject queries fast when workers are overloaded, so that clients back off
+@app.exception_handler(PredictorOverloadedException)
+async def handle_overloaded(request, exc):
+    return PlainTextResponse('Predictor is overloaded, please retry later.', status_code=503, 
+                            headers={ 'Retry-After': str(PREDICTOR_RETRY_AFTER) })
 
 @app.route('/')
-def index():
-    return 'Predictor is up.'
+async def index(request):
+    return PlainTextResponse('Predictor is up.')
+
+@app.route('/cache_metrics')
+async def cache_metrics(request):
+    return PredictionsJSONResponse(predictor.get_cache_metrics())
 
 @app.route('/predict', methods=['POST'])
-def predict():
-    predictor = get_predictor()
-    params = request.get_json()
+async def predict(request):
+    params = await request.json()
     query = params['query']
     
     #TODO: check input type
-    result = predictor.predict(query)
-    return jsonify(result)
+    result = await predictor.predict(query)
+    return PredictionsJSONResponse(result)
+
+@app.route('/predict_batch', methods=['POST'])
+async def predict_batch(request):
+    params = await request.json()
+    queries = params.get('queries')
+
+    if not isinstance(queries, list):
+        return PlainTextResponse('`queries` should be a list of queries.', status_code=400)
+
+    result = await predictor.predict_batch(queries)
+    return PredictionsJSONResponse(result)
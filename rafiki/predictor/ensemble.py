@@ -1,34 +1,126 @@
+import logging
 import numpy as np
-from collections import Iterable
 
-from rafiki.constants import TaskType
+from rafiki.constants import TaskType, EnsembleMethod
 
-def ensemble_predictions(predictions_list, task):
+logger = logging.getLogger(__name__)
+
+class InvalidEnsembleMethodException(Exception): pass
+
+_TASK_TO_DEFAULT_ENSEMBLE_METHOD = {
+    TaskType.IMAGE_CLASSIFICATION: EnsembleMethod.MEAN,
+    TaskType.POS_TAGGING: EnsembleMethod.MAJORITY_VOTE,
+    TaskType.TABLE_REGRESSION: EnsembleMethod.MEAN
+}
+
+_TASK_TO_ENSEMBLE_METHODS = {
+    TaskType.IMAGE_CLASSIFICATION: [EnsembleMethod.MEAN, EnsembleMethod.WEIGHTED_MEAN, EnsembleMethod.MAJORITY_VOTE],
+    TaskType.POS_TAGGING: [EnsembleMethod.MAJORITY_VOTE],
+    TaskType.TABLE_REGRESSION: [EnsembleMethod.MEAN, EnsembleMethod.WEIGHTED_MEAN, EnsembleMethod.MEDIAN]
+}
+
+def ensemble_predictions(predictions_list, task, method=None, weights=None):
+    '''
+    Ensembles the predictions of multiple workers for the same batch of queries.
+
+    ``predictions_list`` is a list of each worker's list of predictions, and ``weights`` is an optional list of
+    each worker's weight (e.g. the score of its trial) for weighted ensemble methods.
+    If ``method`` is not specified or is not supported for the task, the task's default ensemble method is used.
+    Predictions are kept as NumPy arrays where possible, and should only be converted to JSON when responding.
+    '''
     if len(predictions_list) == 0 or len(predictions_list[0]) == 0:
         return []
 
+    if method is not None and method not in _TASK_TO_ENSEMBLE_METHODS.get(task, [method]):
+        logger.warning('Ensemble method {} is not supported for task {}, using its default'.format(method, task))
+        method = None
+
+    if method is None:
+        method = _TASK_TO_DEFAULT_ENSEMBLE_METHOD.get(task)
+
     if task == TaskType.IMAGE_CLASSIFICATION:
-        # Compute mean of probabilities across predictions 
-        predictions = []
-        for preds in np.transpose(predictions_list, axes=[1, 0, 2]):
-            predictions.append(np.mean(preds, axis=0))
+        # Stack probabilities of all workers as a (workers, queries, classes) array
+        probs = np.stack([np.asarray(x, dtype=np.float64) for x in predictions_list])
+        predictions = _ensemble_probabilities(probs, method, weights)
+    elif task == TaskType.POS_TAGGING:
+        predictions = _ensemble_tags(predictions_list, method, weights)
+    elif task == TaskType.TABLE_REGRESSION:
+        # Stack values of all workers as a (workers, queries) array
+        values = np.stack([np.asarray(x, dtype=np.float64) for x in predictions_list])
+        predictions = _ensemble_values(values, method, weights)
     else:
         # By default, just return some trial's predictions
         index = 0
         predictions = predictions_list[index]
 
-    predictions = _simplify_predictions(predictions)
+    return predictions
+
+def _ensemble_probabilities(probs, method, weights):
+    if method == EnsembleMethod.MEAN:
+        return np.mean(probs, axis=0)
+    elif method == EnsembleMethod.WEIGHTED_MEAN:
+        return np.average(probs, axis=0, weights=_normalize_weights(weights, probs.shape[0]))
+    elif method == EnsembleMethod.MAJORITY_VOTE:
+        # Each worker votes for its most probable class, then classes' (weighted) fractions of votes are returned
+        votes = np.argmax(probs, axis=2)
+        votes_one_hot = np.eye(probs.shape[2])[votes]
+        return np.average(votes_one_hot, axis=0, weights=_normalize_weights(weights, probs.shape[0]))
+    else:
+        raise InvalidEnsembleMethodException()
+
+def _ensemble_tags(tags_list, method, weights):
+    if method != EnsembleMethod.MAJORITY_VOTE:
+        raise InvalidEnsembleMethodException()
+
+    workers_count = len(tags_list)
+    weights = _normalize_weights(weights, workers_count)
+    if weights is None:
+        weights = np.ones(workers_count)
+
+    predictions = []
+
+    # For each sentence, each worker votes for a tag for each token
+    for sent_tags_list in zip(*tags_list):
+        try:
+            # Tags of all workers as a (workers, tokens) array
+            sent_tags = np.asarray(sent_tags_list, dtype=np.int64)
+        except ValueError:
+            # Workers disagree on the number of tokens, so just return some trial's tags
+            predictions.append(sent_tags_list[0])
+            continue
+
+        if sent_tags.ndim != 2 or sent_tags.size == 0:
+            predictions.append(sent_tags_list[0])
+            continue
+
+        tokens_count = sent_tags.shape[1]
+        votes = np.zeros((tokens_count, np.max(sent_tags) + 1))
+        np.add.at(votes, (np.tile(np.arange(tokens_count), workers_count), sent_tags.ravel()), 
+                np.repeat(weights, tokens_count))
+        predictions.append(np.argmax(votes, axis=1))
 
     return predictions
 
-def _simplify_predictions(predictions):
-    # Convert numpy arrays to lists
-    if isinstance(predictions, np.ndarray):
-        predictions = predictions.tolist()
+def _ensemble_values(values, method, weights):
+    if method == EnsembleMethod.MEAN:
+        return np.mean(values, axis=0)
+    elif method == EnsembleMethod.WEIGHTED_MEAN:
+        return np.average(values, axis=0, weights=_normalize_weights(weights, values.shape[0]))
+    elif method == EnsembleMethod.MEDIAN:
+        return np.median(values, axis=0)
+    else:
+        raise InvalidEnsembleMethodException()
+
+def _normalize_weights(weights, workers_count):
+    if weights is None:
+        return None
+
+    weights = np.asarray(weights, dtype=np.float64)
 
-    if isinstance(predictions, Iterable):
-        for i in range(len(predictions)):
-            if isinstance(predictions[i], np.ndarray):
-                predictions[i] = predictions[i].tolist()
+    # Fall back to equal weights if weights are unusable
+    # (e.g. scores of trials that are missing or NaN)
+    if weights.shape != (workers_count,) or not np.all(np.isfinite(weights)) or \
+            np.any(weights < 0) or np.sum(weights) <= 0:
+        return None
 
-    return predictions
\ No newline at end of file
+    return weights
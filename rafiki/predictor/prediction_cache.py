@@ -0,0 +1,70 @@
+import json
+import hashlib
+import logging
+from collections import OrderedDict
+
+from rafiki.cache.codec import simplify_numpy_value
+
+logger = logging.getLogger(__name__)
+
+class PredictionCache(object):
+    '''
+    Caches predictions of queries of an inference job, keyed by a canonical hash of the query.
+    Predictions are looked up in a bounded in-process LRU cache, then in a Redis cache that is shared across
+    predictors and expires predictions after a TTL.
+    '''
+    def __init__(self, inference_job_id, cache, max_size, ttl):
+        self._inference_job_id = inference_job_id
+        self._cache = cache
+        self._max_size = max_size
+        self._ttl = ttl
+        self._query_hash_to_prediction = OrderedDict()
+        self._local_hits = 0
+        self._redis_hits = 0
+        self._misses = 0
+
+    # Returns (is_hit, prediction) for the query with hash `query_hash` (see `hash_query`)
+    async def get(self, query_hash):
+        if query_hash in self._query_hash_to_prediction:
+            self._query_hash_to_prediction.move_to_end(query_hash)
+            self._local_hits += 1
+            return (True, self._query_hash_to_prediction[query_hash])
+
+        prediction = await self._cache.get_cached_prediction(self._inference_job_id, query_hash)
+        if prediction is not None:
+            self._add_local(query_hash, prediction)
+            self._redis_hits += 1
+            return (True, prediction)
+
+        self._misses += 1
+        return (False, None)
+
+    async def set(self, query_hash, prediction):
+        self._add_local(query_hash, prediction)
+        await self._cache.add_cached_prediction(self._inference_job_id, query_hash, prediction, self._ttl)
+
+    def get_metrics(self):
+        lookups = self._local_hits + self._redis_hits + self._misses
+        hits = self._local_hits + self._redis_hits
+        return {
+            'size': len(self._query_hash_to_prediction),
+            'lookups': lookups,
+            'local_hits': self._local_hits,
+            'redis_hits': self._redis_hits,
+            'misses': self._misses,
+            'hit_rate': hits / lookups if lookups > 0 else 0
+        }
+
+    def _add_local(self, query_hash, prediction):
+        self._query_hash_to_prediction[query_hash] = prediction
+        self._query_hash_to_prediction.move_to_end(query_hash)
+
+        # Evict least recently used predictions
+        while len(self._query_hash_to_prediction) > self._max_size:
+            self._query_hash_to_prediction.popitem(last=False)
+
+# Hashes the query's canonical JSON, so that equal queries (e.g. as lists or NumPy arrays, or as dicts
+# with keys in any order) have the same hash
+def hash_query(query):
+    canonical_query = json.dumps(query, sort_keys=True, separators=(',', ':'), default=simplify_numpy_value)
+    return hashlib.sha256(canonical_query.encode('utf-8')).hexdigest()
@@ -1,87 +1,309 @@
 import time
+import uuid
 import json
 import logging
 import pickle
+import asyncio
+import traceback
 
-from rafiki.cache import Cache
+from rafiki.cache.async_cache import AsyncCache
 from rafiki.db import Database
-from rafiki.config import PREDICTOR_PREDICT_SLEEP
+from rafiki.config import PREDICTOR_DEFAULT_SLO, PREDICTOR_WORKERS_REFRESH_INTERVAL, \
+    INFERENCE_WORKER_HEARTBEAT_TIMEOUT, PREDICTOR_ENSEMBLE_METHOD, PREDICTOR_CACHE_ENABLED, \
+    PREDICTOR_CACHE_SIZE, PREDICTOR_CACHE_TTL, PREDICTOR_MAX_QUEUE_DEPTH
 
 from .ensemble import ensemble_predictions
+from .prediction_cache import PredictionCache, hash_query
 
 logger = logging.getLogger(__name__)
+
+class PredictorOverloadedException(Exception): pass
+
+# Max time (in seconds) that the dispatcher of predictions blocks for at a time
+PREDICTIONS_POP_TIMEOUT = 1
  
 class Predictor(object):
-
+    '''
+    A long-lived predictor, shared by all requests of its process.
+    Predictions of workers are pushed to a single reply key of the predictor, and 
+    a background dispatcher routes them to the queries awaiting them.
+    '''
     def __init__(self, service_id, db=None, cache=None):
         if db is None: 
             db = Database()
         if cache is None: 
-            cache = Cache()
+            cache = AsyncCache()
 
         self._service_id = service_id
         self._db = db
         self._cache = cache
+        self._reply_id = str(uuid.uuid4())
+        self._query_id_to_future = {}
+        self._query_hash_to_task = {}
+        self._dispatcher = None
+        self._prediction_cache = None
+        self._worker_ids = []
+        self._worker_ids_refresh_time = None
+        self._workers_refresh_lock = None
 
-    def start(self):
+    async def start(self):
         with self._db:
-            (self._inference_job_id, self._task) \
+            (self._inference_job_id, self._task, self._slo, self._worker_to_trial, self._worker_to_score) \
                 = self._read_predictor_info()
 
-    def predict(self, query):
+        await self._cache.connect()
+        self._workers_refresh_lock = asyncio.Lock()
+
+        if PREDICTOR_CACHE_ENABLED:
+            self._prediction_cache = PredictionCache(self._inference_job_id, self._cache, 
+                                                    max_size=PREDICTOR_CACHE_SIZE, ttl=PREDICTOR_CACHE_TTL)
+
+        self._dispatcher = asyncio.ensure_future(self._dispatch_predictions())
+
+    async def stop(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+
+        await self._cache.disconnect()
+
+    async def predict(self, query):
         logger.info('Received query:')
         logger.info(query)
 
-        running_worker_ids = self._cache.get_workers_of_inference_job(self._inference_job_id)
-        worker_to_prediction = {}
-        worker_to_query_id = {}
-        responded_worker_ids = set() 
-        for worker_id in running_worker_ids:
-            query_id = self._cache.add_query_of_worker(worker_id, query)
-            worker_to_query_id[worker_id] = query_id
+        query_hash = hash_query(query)
 
-        logger.info('Waiting for predictions from workers...')
+        if self._prediction_cache is not None:
+            (is_hit, prediction) = await self._prediction_cache.get(query_hash)
+            if is_hit:
+                logger.info('Prediction found in cache')
+                return {
+                    'prediction': prediction,
+                    'responded_workers': [],
+                    'straggler_workers': []
+                }
 
-        #TODO: add SLO. break loop when timer is out.
-        while True:
-            for (worker_id, query_id) in worker_to_query_id.items():
-                if worker_id in responded_worker_ids:
-                    continue
-                    
-                prediction = self._cache.pop_prediction_of_worker(worker_id, query_id)
-                if prediction is not None:
-                    worker_to_prediction[worker_id] = prediction
-                    responded_worker_ids.add(worker_id)
-             
-            if len(responded_worker_ids) == len(running_worker_ids): 
-                break
-
-            time.sleep(PREDICTOR_PREDICT_SLEEP)
+        (prediction, responded_worker_ids, straggler_worker_ids) = \
+            await self._predict_query_coalesced(query, query_hash)
 
-        logger.info('Predictions:')
-        logger.info(worker_to_prediction)
+        return {
+            'prediction': prediction,
+            'responded_workers': responded_worker_ids,
+            'straggler_workers': straggler_worker_ids
+        }
 
-        predictions_list = [
-            [worker_to_prediction[worker_id]]
-            for worker_id in running_worker_ids
-        ]
+    async def predict_batch(self, queries):
+        logger.info('Received batch of {} queries'.format(len(queries)))
 
-        predictions = ensemble_predictions(predictions_list, self._task)
-        prediction = predictions[0] if len(predictions) > 0 else None
+        (predictions, responded_worker_ids, straggler_worker_ids) = await self._predict_queries(queries)
 
         return {
-            'prediction': prediction
+            'predictions': predictions,
+            'responded_workers': responded_worker_ids,
+            'straggler_workers': straggler_worker_ids
         }
 
+    # Coalesces concurrent identical queries into a single fan-out to workers, whose result they all share
+    # Returns (prediction, responded_worker_ids, straggler_worker_ids)
+    async def _predict_query_coalesced(self, query, query_hash):
+        task = self._query_hash_to_task.get(query_hash)
+
+        if task is None:
+            task = asyncio.ensure_future(self._predict_query(query, query_hash))
+            self._query_hash_to_task[query_hash] = task
+            task.add_done_callback(lambda _: self._query_hash_to_task.pop(query_hash, None))
+        else:
+            logger.info('Coalescing with identical query in flight')
+
+        # Shield the shared fan-out, so that it is not cancelled with any 1 of the requests awaiting it
+        return await asyncio.shield(task)
+
+    async def _predict_query(self, query, query_hash):
+        (predictions, responded_worker_ids, straggler_worker_ids) = await self._predict_queries([query])
+        prediction = predictions[0] if len(predictions) > 0 else None
+
+        # Only cache predictions that all workers contributed to
+        if self._prediction_cache is not None and prediction is not None \
+                and len(responded_worker_ids) > 0 and len(straggler_worker_ids) == 0:
+            await self._prediction_cache.set(query_hash, prediction)
+
+        return (prediction, responded_worker_ids, straggler_worker_ids)
+
+    # Returns hit-rate metrics of the prediction cache, or None if it is disabled
+    def get_cache_metrics(self):
+        if self._prediction_cache is None:
+            return None
+
+        return self._prediction_cache.get_metrics()
+
+    # Fans out the batch of queries as a single message to 1 worker of each trial, then ensembles the predictions 
+    # of workers that respond within the SLO
+    # Workers whose queues are full are not sent the queries, and count as stragglers
+    # Raises `PredictorOverloadedException` if the queues of all chosen workers are full
+    # Returns (predictions, responded_worker_ids, straggler_worker_ids)
+    async def _predict_queries(self, queries):
+        deadline = time.time() + self._slo
+        (running_worker_ids, overloaded_worker_ids) = \
+            await self._choose_worker_per_trial(await self._get_running_worker_ids())
+
+        if len(running_worker_ids) == 0 and len(overloaded_worker_ids) > 0:
+            raise PredictorOverloadedException()
+
+        # Register futures of queries before adding them, so that no predictions are missed by the dispatcher
+        loop = asyncio.get_event_loop()
+        worker_to_query_id = { x: str(uuid.uuid4()) for x in running_worker_ids }
+        worker_to_future = {}
+        for (worker_id, query_id) in worker_to_query_id.items():
+            future = loop.create_future()
+            self._query_id_to_future[query_id] = future
+            worker_to_future[worker_id] = future
+
+        worker_to_predictions = {}
+        try:
+            if len(worker_to_query_id) > 0:
+                await self._cache.add_queries_of_workers(worker_to_query_id, queries, self._reply_id, 
+                                                        deadline=deadline)
+
+                logger.info('Waiting for predictions from workers...')
+                timeout = max(0, deadline - time.time())
+                await asyncio.wait(list(worker_to_future.values()), timeout=timeout)
+
+            worker_to_predictions = {
+                worker_id: future.result()
+                for (worker_id, future) in worker_to_future.items()
+                if future.done() and not future.cancelled()
+            }
+        finally:
+            for query_id in worker_to_query_id.values():
+                self._query_id_to_future.pop(query_id, None)
+
+        responded_worker_ids = [x for x in running_worker_ids if x in worker_to_predictions]
+        straggler_worker_ids = [x for x in running_worker_ids if x not in worker_to_predictions] + \
+                                overloaded_worker_ids
+
+        if len(straggler_worker_ids) > 0:
+            logger.warning('Workers did not respond within SLO of {}s: {}' \
+                .format(self._slo, straggler_worker_ids))
+
+        logger.info('Predictions:')
+        logger.info(worker_to_predictions)
+
+        # Ensemble predictions of workers that have responded
+        predictions_list = [worker_to_predictions[x] for x in responded_worker_ids]
+        weights = [self._worker_to_score.get(x, 0) for x in responded_worker_ids]
+        predictions = ensemble_predictions(predictions_list, self._task, 
+                                            method=PREDICTOR_ENSEMBLE_METHOD, weights=weights)
+
+        return (predictions, responded_worker_ids, straggler_worker_ids)
+
+    # Continuously pops predictions at the predictor's reply key, resolving the futures of their queries
+    async def _dispatch_predictions(self):
+        while True:
+            try:
+                for (query_id, predictions) in \
+                        await self._cache.pop_predictions(self._reply_id, timeout=PREDICTIONS_POP_TIMEOUT):
+                    future = self._query_id_to_future.get(query_id)
+
+                    # Predictions of queries that are no longer awaited (e.g. past their SLO) are discarded
+                    if future is not None and not future.done():
+                        future.set_result(predictions)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.error('Error while dispatching predictions:')
+                logger.error(traceback.format_exc())
+                await asyncio.sleep(PREDICTIONS_POP_TIMEOUT)
+
+    # Groups workers by trial, and chooses the worker with the fewest queued queries for each trial
+    # Returns (worker_ids, overloaded_worker_ids), where chosen workers with full queues are overloaded
+    async def _choose_worker_per_trial(self, worker_ids):
+        trial_to_worker_ids = {}
+        for worker_id in worker_ids:
+            trial_id = self._worker_to_trial.get(worker_id, worker_id)
+            trial_to_worker_ids.setdefault(trial_id, []).append(worker_id)
+
+        worker_to_queue_length = {}
+        if len(worker_ids) > 0:
+            queue_lengths = await self._cache.get_queue_lengths_of_workers(worker_ids)
+            worker_to_queue_length = dict(zip(worker_ids, queue_lengths))
+
+        chosen_worker_ids = [
+            min(x, key=lambda worker_id: worker_to_queue_length.get(worker_id, 0))
+            for x in trial_to_worker_ids.values()
+        ]
+
+        overloaded_worker_ids = [x for x in chosen_worker_ids 
+                                if worker_to_queue_length.get(x, 0) >= PREDICTOR_MAX_QUEUE_DEPTH]
+        if len(overloaded_worker_ids) > 0:
+            logger.warning('Queues of workers are full: {}'.format(overloaded_worker_ids))
+
+        return (
+            [x for x in chosen_worker_ids if x not in overloaded_worker_ids],
+            overloaded_worker_ids
+        )
+
+    # Returns the inference job's running workers, refreshing them from cache only periodically
+    async def _get_running_worker_ids(self):
+        if self._if_worker_ids_stale():
+            # Only 1 request refreshes workers at a time
+            async with self._workers_refresh_lock:
+                if self._if_worker_ids_stale():
+                    await self._refresh_workers()
+
+        return self._worker_ids
+
+    def _if_worker_ids_stale(self):
+        return self._worker_ids_refresh_time is None or \
+            time.time() - self._worker_ids_refresh_time >= PREDICTOR_WORKERS_REFRESH_INTERVAL
+
+    async def _refresh_workers(self):
+        worker_ids = await self._cache.get_workers_of_inference_job(self._inference_job_id, 
+                                                                heartbeat_timeout=INFERENCE_WORKER_HEARTBEAT_TIMEOUT)
+
+        # Workers may be added to the inference job after the predictor has started
+        # Read them from DB in a thread, so that requests are not blocked meanwhile
+        if any(x not in self._worker_to_trial for x in worker_ids):
+            loop = asyncio.get_event_loop()
+            (self._worker_to_trial, self._worker_to_score) = \
+                await loop.run_in_executor(None, self._read_workers_info_from_db, self._inference_job_id)
+
+        self._worker_ids = worker_ids
+        self._worker_ids_refresh_time = time.time()
+
+    def _read_workers_info_from_db(self, inference_job_id):
+        with self._db:
+            return self._read_workers_info(inference_job_id)
+
     def _read_predictor_info(self):
         inference_job = self._db.get_inference_job_by_predictor(self._service_id)
         train_job = self._db.get_train_job(inference_job.train_job_id)
 
+        slo = inference_job.slo if inference_job.slo is not None else PREDICTOR_DEFAULT_SLO
+        (worker_to_trial, worker_to_score) = self._read_workers_info(inference_job.id)
+
         return (
             inference_job.id,
-            train_job.task
+            train_job.task,
+            slo,
+            worker_to_trial,
+            worker_to_score
         )
 
-    def predict_batch(self, queries):
-        #TODO: implement method
-        pass
+    # Maps each worker to its trial, and to the score of its trial for weighting its predictions
+    # Returns (worker_to_trial, worker_to_score)
+    def _read_workers_info(self, inference_job_id):
+        rows = self._db.get_workers_with_services_of_inference_job(inference_job_id)
+        worker_to_trial = {
+            worker.service_id: trial.id
+            for (worker, _, trial, _) in rows
+        }
+        worker_to_score = {
+            worker.service_id: trial.score
+            for (worker, _, trial, _) in rows
+        }
+
+        return (worker_to_trial, worker_to_score)
@@ -0,0 +1,2 @@
+from .store import FileArtifactStore, dump_parameters, load_parameters, \
+    InvalidArtifactUriException, ArtifactChecksumMismatchException
\ No newline at end of file
@@ -0,0 +1,127 @@
+import os
+import io
+import pickle
+import hashlib
+import tempfile
+from urllib.parse import urlparse
+from urllib.request import url2pathname, pathname2url
+
+from rafiki.config import ARTIFACT_STORE_FOLDER_PATH, ARTIFACT_STORE_CHUNK_SIZE
+
+class InvalidArtifactUriException(Exception): pass
+class ArtifactChecksumMismatchException(Exception): pass
+
+class FileArtifactStore(object):
+    '''
+    Stores artifacts (e.g. trials' parameters) as files in a folder on the shared work directory,
+    addressed by ``file://`` URIs and verified by their SHA-256 checksums.
+    Artifacts are read & written in chunks, without holding them in memory whole.
+    '''
+    def __init__(self, folder_path=ARTIFACT_STORE_FOLDER_PATH, chunk_size=ARTIFACT_STORE_CHUNK_SIZE):
+        self._folder_path = folder_path
+        self._chunk_size = chunk_size
+
+    # Returns a writable file-like object for a new artifact named `name`
+    # The artifact is only saved when the object is closed without error, after which
+    # its URI and checksum are available as `uri` and `checksum`
+    def open_write(self, name):
+        os.makedirs(self._folder_path, exist_ok=True)
+        file_path = os.path.join(self._folder_path, name)
+        return _ArtifactWriter(file_path, self._chunk_size)
+
+    # Returns a readable file-like object of the artifact at `uri`
+    # If `checksum` is passed, raises `ArtifactChecksumMismatchException` when the object is closed
+    # if the artifact's contents do not match it
+    def open_read(self, uri, checksum=None):
+        file_path = self._get_file_path(uri)
+        raw = _HashingReader(open(file_path, 'rb'), checksum)
+        return _ArtifactReader(raw, self._chunk_size)
+
+    def delete(self, uri):
+        file_path = self._get_file_path(uri)
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+    def _get_file_path(self, uri):
+        parsed_uri = urlparse(uri)
+        if parsed_uri.scheme != 'file':
+            raise InvalidArtifactUriException(uri)
+
+        return url2pathname(parsed_uri.path)
+
+# Pickles `parameters` into a new artifact named `name` in the store
+# Returns (uri, checksum)
+def dump_parameters(store, name, parameters):
+    with store.open_write(name) as f:
+        pickle.dump(parameters, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    return (f.uri, f.checksum)
+
+# Unpickles parameters from the artifact at `uri` in the store, verifying its checksum
+def load_parameters(store, uri, checksum=None):
+    with store.open_read(uri, checksum) as f:
+        return pickle.load(f)
+
+class _ArtifactWriter(io.BufferedWriter):
+    def __init__(self, file_path, chunk_size):
+        # Write to a temp file, then move it into place, so that partial artifacts are never read
+        (fd, self._temp_file_path) = tempfile.mkstemp(dir=os.path.dirname(file_path),
+                                                    prefix='.{}-'.format(os.path.basename(file_path)))
+        self._file_path = file_path
+        self._hash = hashlib.sha256()
+        self.uri = None
+        self.checksum = None
+        super().__init__(io.FileIO(fd, 'wb'), buffer_size=chunk_size)
+
+    def write(self, data):
+        self._hash.update(data)
+        return super().write(data)
+
+    def __exit__(self, exc_type, exc_value, tb):
+        super().__exit__(exc_type, exc_value, tb)
+
+        if exc_type is not None:
+            os.remove(self._temp_file_path)
+            return
+
+        os.replace(self._temp_file_path, self._file_path)
+        self.uri = 'file://{}'.format(pathname2url(os.path.abspath(self._file_path)))
+        self.checksum = self._hash.hexdigest()
+
+class _ArtifactReader(io.BufferedReader):
+    def __exit__(self, exc_type, exc_value, tb):
+        try:
+            # Readers may stop before the end of the artifact, so finish hashing it before verifying its checksum
+            if exc_type is None:
+                self.raw.verify()
+        finally:
+            super().__exit__(exc_type, exc_value, tb)
+
+class _HashingReader(io.RawIOBase):
+    def __init__(self, file, checksum):
+        self._file = file
+        self._checksum = checksum
+        self._hash = hashlib.sha256()
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = self._file.readinto(b)
+        if n:
+            self._hash.update(memoryview(b)[:n])
+        return n
+
+    def verify(self):
+        if self._checksum is None:
+            return
+
+        while self.read(ARTIFACT_STORE_CHUNK_SIZE):
+            pass
+
+        if self._hash.hexdigest() != self._checksum:
+            raise ArtifactChecksumMismatchException()
+
+    def close(self):
+        self._file.close()
+        super().close()
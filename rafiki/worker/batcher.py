@@ -0,0 +1,37 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+class AdaptiveBatcher(object):
+    '''
+    Adapts the max batch size of queries for a model with additive-increase-multiplicative-decrease (AIMD), 
+    as in Clipper: the batch size is increased additively while batches are predicted within the latency SLO, 
+    and is decreased multiplicatively once a batch exceeds the SLO.
+    '''
+    def __init__(self, slo, max_batch_size, min_batch_size=1, initial_batch_size=1,
+                additive_increase=1, multiplicative_decrease=0.9):
+        self._slo = slo
+        self._max_batch_size = max_batch_size
+        self._min_batch_size = min_batch_size
+        self._additive_increase = additive_increase
+        self._multiplicative_decrease = multiplicative_decrease
+        self._batch_size = min(max(initial_batch_size, min_batch_size), max_batch_size)
+
+    @property
+    def batch_size(self):
+        return self._batch_size
+
+    # Updates the max batch size based on the measured latency of predicting a batch of a size
+    def feedback(self, batch_size, latency):
+        if latency > self._slo:
+            new_batch_size = max(self._min_batch_size, int(batch_size * self._multiplicative_decrease))
+        elif batch_size >= self._batch_size:
+            # Only grow when the batch was full, otherwise the latency says nothing about larger batches
+            new_batch_size = min(self._max_batch_size, self._batch_size + self._additive_increase)
+        else:
+            return
+
+        if new_batch_size != self._batch_size:
+            logger.info('Changing max batch size from {} to {} (latency of {:.3f}s for batch of size {})' \
+                .format(self._batch_size, new_batch_size, latency, batch_size))
+            self._batch_size = new_batch_size
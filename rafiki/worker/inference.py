@@ -6,27 +6,41 @@ import pickle
 import logging
 import traceback
 import json
+import numpy as np
 
-from rafiki.model import load_model_class
+from rafiki.model import load_model_class, load_model_class_from_file
 from rafiki.db import Database
 from rafiki.cache import Cache
-from rafiki.config import INFERENCE_WORKER_SLEEP, INFERENCE_WORKER_PREDICT_BATCH_SIZE
+from rafiki.store import FileArtifactStore, load_parameters
+from rafiki.config import INFERENCE_WORKER_POP_TIMEOUT, INFERENCE_WORKER_PREDICT_BATCH_SIZE, \
+    INFERENCE_WORKER_PREDICT_SLO, INFERENCE_WORKER_BATCH_WINDOW, INFERENCE_WORKER_HEARTBEAT_INTERVAL
+
+from .batcher import AdaptiveBatcher
+from .model_cache import ModelCache
 
 logger = logging.getLogger(__name__)
 
 class InvalidWorkerException(Exception): pass
 
 class InferenceWorker(object):
-    def __init__(self, service_id, cache=None, db=None):
+    def __init__(self, service_id, cache=None, db=None, model_cache=None, artifact_store=None):
         if cache is None: 
             cache = Cache()
         if db is None: 
             db = Database()
+        if model_cache is None:
+            model_cache = ModelCache()
+        if artifact_store is None:
+            artifact_store = FileArtifactStore()
 
         self._cache = cache
         self._db = db
+        self._model_cache = model_cache
+        self._artifact_store = artifact_store
         self._service_id = service_id
         self._model = None
+        self._batcher = AdaptiveBatcher(slo=INFERENCE_WORKER_PREDICT_SLO, 
+                                        max_batch_size=INFERENCE_WORKER_PREDICT_BATCH_SIZE)
         
     def start(self):
         logger.info('Starting inference worker for service of id {}...' \
@@ -38,18 +52,39 @@ class InferenceWorker(object):
 
         # Add to inference job's set of running workers
         self._cache.add_worker_of_inference_job(self._service_id, inference_job_id)
+        last_heartbeat_time = time.time()
             
         while True:
-            (query_ids, queries) = \
-                self._cache.pop_queries_of_worker(self._service_id, INFERENCE_WORKER_PREDICT_BATCH_SIZE)
+            # Send heartbeat to keep worker in inference job's set of running workers
+            if time.time() - last_heartbeat_time >= INFERENCE_WORKER_HEARTBEAT_INTERVAL:
+                self._cache.add_worker_of_inference_job(self._service_id, inference_job_id)
+                last_heartbeat_time = time.time()
+
+            # Max no. of queries to predict at once
+            batch_size = self._batcher.batch_size
+
+            # Blocks until there are queries
+            (query_ids, reply_ids, queries_list) = \
+                self._cache.pop_queries_of_worker(self._service_id, 1, timeout=INFERENCE_WORKER_POP_TIMEOUT)
+
+            if len(queries_list) > 0:
+                self._pop_more_queries(batch_size, query_ids, reply_ids, queries_list)
+
+                # If batch is not full, wait for a short window for more queries to fill it
+                if self._count_queries(queries_list) < batch_size and INFERENCE_WORKER_BATCH_WINDOW > 0:
+                    time.sleep(INFERENCE_WORKER_BATCH_WINDOW)
+                    self._pop_more_queries(batch_size, query_ids, reply_ids, queries_list)
             
-            if len(queries) > 0:
+            if len(queries_list) > 0:
+                # Flatten batches of queries to make predictions for all of them at once
+                queries = self._flatten_queries(queries_list)
+
                 logger.info('Making predictions for queries...')
                 logger.info(queries)
 
                 predictions = None
                 try:
-                    predictions = self._model.predict(queries)
+                    predictions = self._predict(queries, batch_size)
                 except Exception:
                     logger.error('Error while making predictions:')
                     logger.error(traceback.format_exc())
@@ -58,10 +93,12 @@ class InferenceWorker(object):
                     logger.info('Predictions:')
                     logger.info(predictions)
 
-                    for (query_id, prediction) in zip(query_ids, predictions):
-                        self._cache.add_prediction_of_worker(self._service_id, query_id, prediction)
-
-            time.sleep(INFERENCE_WORKER_SLEEP)
+                    # Split predictions back into their batches of queries
+                    i = 0
+                    for (query_id, reply_id, queries) in zip(query_ids, reply_ids, queries_list):
+                        self._cache.add_predictions_of_worker(self._service_id, query_id, reply_id,
+                                                            predictions[i:(i + len(queries))])
+                        i += len(queries)
 
     def stop(self):
         with self._db:
@@ -75,20 +112,69 @@ class InferenceWorker(object):
             self._model = None
 
     def _load_model(self, trial_id):
-        trial = self._db.get_trial(trial_id)
-        model = self._db.get_model(trial.model_id)
+        # Load model from the model cache if possible, otherwise from DB & artifact store
+        res = self._model_cache.get(trial_id)
+        if res is not None:
+            logger.info('Loading model of trial {} from model cache...'.format(trial_id))
+            (model_file_path, model_file_hash, model_class, knobs, parameters) = res
+            clazz = load_model_class_from_file(model_file_path, model_file_hash, model_class)
+        else:
+            trial = self._db.get_trial(trial_id)
+            model = self._db.get_model(trial.model_id, with_model_file=True)
+            (model_file_bytes, model_class, knobs) = (model.model_file_bytes, model.model_class, trial.knobs)
+
+            # Stream model parameters from artifact store
+            parameters = load_parameters(self._artifact_store, trial.parameters_uri, trial.parameters_checksum)
+
+            self._model_cache.put(trial_id, model_file_bytes, model_class, knobs, parameters)
+            clazz = load_model_class(model_file_bytes, model_class)
 
         # Load model based on trial
-        clazz = load_model_class(model.model_file_bytes, model.model_class)
         model_inst = clazz()
-        model_inst.init(trial.knobs)
-
-        # Unpickle model parameters and load it
-        parameters = pickle.loads(trial.parameters)
+        model_inst.init(knobs)
         model_inst.load_parameters(parameters)
 
         return model_inst
 
+    # Pops more batches of queries until there are at least `batch_size` queries, or until there are no more
+    def _pop_more_queries(self, batch_size, query_ids, reply_ids, queries_list):
+        query_count = self._count_queries(queries_list)
+        while query_count < batch_size:
+            # Each batch has at least 1 query
+            (more_query_ids, more_reply_ids, more_queries_list) = \
+                self._cache.pop_queries_of_worker(self._service_id, batch_size - query_count)
+
+            if len(more_queries_list) == 0:
+                break
+
+            query_ids.extend(more_query_ids)
+            reply_ids.extend(more_reply_ids)
+            queries_list.extend(more_queries_list)
+            query_count += self._count_queries(more_queries_list)
+
+    # Predicts queries in batches of at most `batch_size`, so that the model's input is bounded
+    # regardless of the sizes of the batches of queries popped
+    def _predict(self, queries, batch_size):
+        predictions = []
+        for i in range(0, len(queries), batch_size):
+            batch_queries = queries[i:(i + batch_size)]
+            start_time = time.time()
+            predictions.extend(self._model.predict(batch_queries))
+            self._batcher.feedback(len(batch_queries), time.time() - start_time)
+
+        return predictions
+
+    def _count_queries(self, queries_list):
+        return sum(len(x) for x in queries_list)
+
+    def _flatten_queries(self, queries_list):
+        # Batches of queries decoded as NumPy arrays are concatenated as a single array
+        if all(isinstance(x, np.ndarray) for x in queries_list) and \
+            len(set(x.shape[1:] for x in queries_list)) == 1:
+            return np.concatenate(queries_list) if len(queries_list) > 1 else queries_list[0]
+
+        return [query for queries in queries_list for query in queries]
+
     def _read_worker_info(self):
         worker = self._db.get_inference_job_worker(self._service_id)
         inference_job = self._db.get_inference_job(worker.inference_job_id)
@@ -0,0 +1,168 @@
+import os
+import json
+import pickle
+import hashlib
+import shutil
+import tempfile
+import logging
+import numpy as np
+
+from rafiki.config import MODEL_CACHE_FOLDER_PATH, MODEL_CACHE_MAX_COUNT
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILE_NAME = 'model.py'
+META_FILE_NAME = 'meta.json'
+
+class ModelCache(object):
+    '''
+    Caches trials' models on the work directory, keyed by trial ID, so that workers can load models
+    without fetching them from the database or unpickling their parameters.
+    Each trial's folder holds the trial's model file, to be imported from where it is, and its parameters in
+    a fast-loading format: NumPy arrays as ``.npy`` files that are memory-mapped, bytes & strings as raw files,
+    and numbers in the trial's metadata. Only other values are pickled.
+    Only the `max_count` most recently used trials are kept.
+    '''
+    def __init__(self, folder_path=MODEL_CACHE_FOLDER_PATH, max_count=MODEL_CACHE_MAX_COUNT):
+        self._folder_path = folder_path
+        self._max_count = max_count
+
+    # Returns (model_file_path, model_file_hash, model_class, knobs, parameters) of the trial, or None if it is not cached
+    def get(self, trial_id):
+        trial_folder_path = os.path.join(self._folder_path, trial_id)
+        if not os.path.isdir(trial_folder_path):
+            return None
+
+        try:
+            with open(os.path.join(trial_folder_path, META_FILE_NAME), 'r') as f:
+                meta = json.load(f)
+
+            parameters = _load_parameters(trial_folder_path, meta['parameters'])
+
+            # Mark trial as recently used
+            os.utime(trial_folder_path)
+        except Exception:
+            logger.warning('Failed to read cached model of trial {}'.format(trial_id), exc_info=True)
+            return None
+
+        model_file_path = os.path.join(trial_folder_path, MODEL_FILE_NAME)
+        return (model_file_path, meta['model_file_hash'], meta['model_class'], meta['knobs'], parameters)
+
+    def put(self, trial_id, model_file_bytes, model_class, knobs, parameters):
+        os.makedirs(self._folder_path, exist_ok=True)
+        trial_folder_path = os.path.join(self._folder_path, trial_id)
+        if os.path.isdir(trial_folder_path):
+            return
+
+        # Write to a temp folder, then move it into place, so that other workers never see partial models
+        temp_folder_path = tempfile.mkdtemp(dir=self._folder_path, prefix='.{}-'.format(trial_id))
+        try:
+            with open(os.path.join(temp_folder_path, MODEL_FILE_NAME), 'wb') as f:
+                f.write(model_file_bytes)
+
+            parameters_meta = _dump_parameters(temp_folder_path, parameters)
+
+            with open(os.path.join(temp_folder_path, META_FILE_NAME), 'w') as f:
+                json.dump({
+                    'model_file_hash': hashlib.sha256(model_file_bytes).hexdigest(),
+                    'model_class': model_class,
+                    'knobs': knobs,
+                    'parameters': parameters_meta
+                }, f)
+
+            os.rename(temp_folder_path, trial_folder_path)
+        except Exception:
+            # Another worker may have cached the trial's model concurrently
+            if not os.path.isdir(trial_folder_path):
+                logger.warning('Failed to cache model of trial {}'.format(trial_id), exc_info=True)
+        finally:
+            shutil.rmtree(temp_folder_path, ignore_errors=True)
+
+        self._evict()
+
+    def delete(self, trial_id):
+        shutil.rmtree(os.path.join(self._folder_path, trial_id), ignore_errors=True)
+
+    # Deletes the least recently used trials beyond `max_count`
+    def _evict(self):
+        trial_to_used_time = {}
+        for trial_id in os.listdir(self._folder_path):
+            # Skip temp folders of trials being cached
+            if trial_id.startswith('.'):
+                continue
+
+            try:
+                trial_to_used_time[trial_id] = os.path.getmtime(os.path.join(self._folder_path, trial_id))
+            except OSError:
+                # Another worker may have evicted the trial concurrently
+                continue
+
+        trial_ids = sorted(trial_to_used_time, key=lambda x: trial_to_used_time[x], reverse=True)
+        for trial_id in trial_ids[self._max_count:]:
+            logger.info('Evicting cached model of trial {}...'.format(trial_id))
+            self.delete(trial_id)
+
+# Saves each of the parameters as a file in the folder, in a format based on its type
+# Parameters that are not a dict of strings to values are pickled whole
+# Returns the metadata to load the parameters with
+def _dump_parameters(folder_path, parameters):
+    if not isinstance(parameters, dict) or not all(isinstance(x, str) for x in parameters):
+        return { 'type': 'pickle', 'file': _dump_parameter(folder_path, 'parameters', parameters)['file'] }
+
+    return {
+        'type': 'dict',
+        'values': [
+            { 'name': name, **_dump_parameter(folder_path, str(i), value) }
+            for (i, (name, value)) in enumerate(parameters.items())
+        ]
+    }
+
+def _dump_parameter(folder_path, file_name, value):
+    if isinstance(value, np.ndarray) and not value.dtype.hasobject:
+        file_name = '{}.npy'.format(file_name)
+        np.save(os.path.join(folder_path, file_name), value, allow_pickle=False)
+
+        # Empty arrays can't be memory-mapped
+        return { 'type': 'npy', 'file': file_name, 'mmap': value.size > 0 }
+    elif isinstance(value, bytes):
+        with open(os.path.join(folder_path, file_name), 'wb') as f:
+            f.write(value)
+        return { 'type': 'bytes', 'file': file_name }
+    elif isinstance(value, str):
+        with open(os.path.join(folder_path, file_name), 'wb') as f:
+            f.write(value.encode('utf-8'))
+        return { 'type': 'str', 'file': file_name }
+    elif value is None or type(value) in (bool, int, float):
+        return { 'type': 'json', 'value': value }
+    else:
+        file_name = '{}.pickle'.format(file_name)
+        with open(os.path.join(folder_path, file_name), 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return { 'type': 'pickle', 'file': file_name }
+
+def _load_parameters(folder_path, meta):
+    if meta['type'] == 'pickle':
+        return _load_parameter(folder_path, meta)
+
+    return {
+        x['name']: _load_parameter(folder_path, x)
+        for x in meta['values']
+    }
+
+def _load_parameter(folder_path, meta):
+    if meta['type'] == 'json':
+        return meta['value']
+
+    file_path = os.path.join(folder_path, meta['file'])
+    if meta['type'] == 'npy':
+        # Map arrays into memory copy-on-write, rather than reading them
+        return np.load(file_path, mmap_mode=('c' if meta['mmap'] else None))
+    elif meta['type'] == 'bytes':
+        with open(file_path, 'rb') as f:
+            return f.read()
+    elif meta['type'] == 'str':
+        with open(file_path, 'rb') as f:
+            return f.read().decode('utf-8')
+    else:
+        with open(file_path, 'rb') as f:
+            return pickle.load(f)
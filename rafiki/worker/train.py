@@ -2,15 +2,19 @@ import time
 import logging
 import os
 import traceback
-import pickle
 import pprint
+import signal
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 
-from rafiki.config import SUPERADMIN_EMAIL, SUPERADMIN_PASSWORD
+from rafiki.config import SUPERADMIN_EMAIL, SUPERADMIN_PASSWORD, TRAIN_WORKER_CONCURRENT_TRIALS, \
+    TRAIN_WORKER_BUDGET_WAIT
 from rafiki.constants import TrainJobStatus, TrialStatus, BudgetType
 from rafiki.model import load_model_class
 from rafiki.utils.log import JobLogger
 from rafiki.model import ModelLogUtilsLogger
-from rafiki.db import Database
+from rafiki.db import Database, dispose_inherited_engines
+from rafiki.store import FileArtifactStore, dump_parameters
 from rafiki.client import Client
 
 logger = logging.getLogger(__name__)
@@ -21,18 +25,28 @@ class InvalidBudgetTypeException(Exception): pass
 class InvalidWorkerException(Exception): pass
 
 class TrainWorker(object):
-    def __init__(self, service_id, db=None):
+    def __init__(self, service_id, db=None, artifact_store=None, concurrent_trials=TRAIN_WORKER_CONCURRENT_TRIALS):
         if db is None: 
             db = Database()
+        if artifact_store is None:
+            artifact_store = FileArtifactStore()
             
         self._service_id = service_id
         self._db = db
+        self._artifact_store = artifact_store
         self._trial_id = None
+        self._concurrent_trials = concurrent_trials
+        self._trial_id_to_knobs = {} # Running trials, if running trials concurrently
+        self._pool = None
         self._client = self._make_client()
 
     def start(self):
         logger.info('Starting train worker for service of ID "{}"...' \
             .format(self._service_id))
+
+        if self._concurrent_trials > 1:
+            self._start_concurrent_trials()
+            return
             
         advisor_id = None
         while True:
@@ -92,11 +106,15 @@ class TrainWorker(object):
                 (score, parameters, logs) = self._train_and_evaluate_model(clazz, knobs, train_dataset_uri, 
                                                                         test_dataset_uri)
                 logger.info('Trial score: {}'.format(score))
+
+                logger.info('Saving trial\'s parameters to artifact store...')
+                (parameters_uri, parameters_checksum) = \
+                    dump_parameters(self._artifact_store, self._trial_id, parameters)
                 
                 with self._db:
                     logger.info('Marking trial as complete in DB...')
                     trial = self._db.get_trial(self._trial_id)
-                    self._db.mark_trial_as_complete(trial, score, parameters, logs)
+                    self._db.mark_trial_as_complete(trial, score, parameters_uri, parameters_checksum, logs)
 
                 self._trial_id = None
             except Exception:
@@ -118,20 +136,140 @@ class TrainWorker(object):
                 logger.error('Error while sending result of proposal to advisor:')
                 logger.error(traceback.format_exc())
             
+    # Runs up to `concurrent_trials` trials at once in a pool of processes, each recorded independently
+    def _start_concurrent_trials(self):
+        logger.info('Running up to {} trials concurrently...'.format(self._concurrent_trials))
+        self._pool = ProcessPoolExecutor(max_workers=self._concurrent_trials)
+        future_to_trial_id = {}
+        advisor_id = None
+
+        try:
+            while True:
+                with self._db:
+                    (budget, model_id,
+                        model_file_bytes, model_class, train_job_id, 
+                        train_dataset_uri, test_dataset_uri) = self._read_worker_info()
+                    budget_reached = self._if_budget_taken(budget, train_job_id, model_id)
+
+                # Trials that are still running (possibly of other workers) count towards the budget, so
+                # the worker stops once its own trials have finished
+                if budget_reached and len(future_to_trial_id) == 0:
+                    # If budget reached
+                    logger.info('Budget for train job has reached')
+                    self._stop_worker()
+                    if advisor_id is not None:
+                        self._delete_advisor(advisor_id)
+
+                    break
+
+                # If not created, create a Rafiki advisor for train worker to propose knobs in trials
+                if advisor_id is None:
+                    logger.info('Creating Rafiki advisor...')
+                    try: 
+                        clazz = load_model_class(model_file_bytes, model_class)
+                        advisor_id = self._create_advisor(clazz)
+                        logger.info('Created advisor of ID "{}"'.format(advisor_id))
+                    except Exception as e:
+                        logger.error('Error while creating advisor for worker:')
+                        logger.error(traceback.format_exc())
+                        self._stop_worker()
+                        raise e
+
+                # Top up running trials with new trials, as far as budget allows
+                trial_count = self._concurrent_trials - len(future_to_trial_id)
+                if not budget_reached and trial_count > 0:
+                    logger.info('Requesting for {} knobs proposals from advisor...'.format(trial_count))
+                    knobs_list = self._get_proposals_from_advisor(advisor_id, trial_count)
+                    logger.info('Creating new trials in DB within budget...')
+                    trials = self._create_new_trials_within_budget(model_id, train_job_id, knobs_list, budget)
+
+                    # Release proposals that budget did not allow trials for, so that the advisor doesn't wait on them
+                    if len(trials) < len(knobs_list):
+                        self._release_proposals_to_advisor(advisor_id, knobs_list[len(trials):])
+
+                    for (trial_id, knobs) in trials:
+                        logger.info('Starting trial of ID "{}" with knobs:'.format(trial_id))
+                        logger.info(pprint.pformat(knobs))
+                        future = self._pool.submit(_run_trial, self._artifact_store, model_file_bytes, model_class, 
+                                                knobs, train_dataset_uri, test_dataset_uri, trial_id)
+                        future_to_trial_id[future] = trial_id
+                        self._trial_id_to_knobs[trial_id] = knobs
+
+                # Budget was taken up by other workers since it was checked
+                if len(future_to_trial_id) == 0:
+                    time.sleep(TRAIN_WORKER_BUDGET_WAIT)
+                    continue
+
+                # Wait for any of the running trials to finish, then record their results
+                (done_futures, _) = wait(list(future_to_trial_id.keys()), return_when=FIRST_COMPLETED)
+                for future in done_futures:
+                    trial_id = future_to_trial_id.pop(future)
+                    knobs = self._trial_id_to_knobs.pop(trial_id)
+                    score = self._record_trial_result(trial_id, future)
+
+                    # Report results of trial to advisor
+                    try:
+                        logger.info('Sending result of trial\'s knobs to advisor...')
+                        self._feedback_to_advisor(advisor_id, knobs, score)
+                    except Exception:
+                        logger.error('Error while sending result of proposal to advisor:')
+                        logger.error(traceback.format_exc())
+        finally:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    # Marks the trial as complete or errored in DB based on the result of its future
+    # Returns the trial's score
+    def _record_trial_result(self, trial_id, future):
+        try:
+            (score, parameters_uri, parameters_checksum, logs) = future.result()
+            logger.info('Score of trial of ID "{}": {}'.format(trial_id, score))
+
+            with self._db:
+                logger.info('Marking trial as complete in DB...')
+                trial = self._db.get_trial(trial_id)
+                self._db.mark_trial_as_complete(trial, score, parameters_uri, parameters_checksum, logs)
+
+            return score
+        except BaseException:
+            # Includes exits of the trial's process, e.g. on `SystemExit` from the model
+            logger.error('Error while running trial of ID "{}":'.format(trial_id))
+            logger.error(traceback.format_exc())
+            logger.info('Marking trial as errored in DB...')
+
+            with self._db:
+                trial = self._db.get_trial(trial_id)
+                self._db.mark_trial_as_errored(trial)
+
+            return 0
+
     def stop(self):
-        # If worker is currently running a trial, mark it has terminated
+        # If worker is currently running trials, mark them as terminated
         logger.info('Marking trial as terminated in DB...')
         try:
-            if self._trial_id is not None: 
+            trial_ids = list(self._trial_id_to_knobs.keys())
+            if self._trial_id is not None:
+                trial_ids.append(self._trial_id)
+
+            if len(trial_ids) > 0:
                 with self._db:
-                    trial = self._db.get_trial(self._trial_id)
-                    self._db.mark_trial_as_terminated(trial)
+                    for trial_id in trial_ids:
+                        trial = self._db.get_trial(trial_id)
+                        self._db.mark_trial_as_terminated(trial)
 
         except Exception:
             logger.error('Error marking trial as terminated:')
             logger.error(traceback.format_exc())
 
-    def _train_and_evaluate_model(self, clazz, knobs, train_dataset_uri, 
+        # Terminate processes of running trials, so that they stop training & saving parameters
+        # `ProcessPoolExecutor` has no public way to do so, but its processes are the worker's only child processes
+        if self._pool is not None:
+            for process in multiprocessing.active_children():
+                process.terminate()
+            self._pool.shutdown(wait=False)
+
+    @staticmethod
+    def _train_and_evaluate_model(clazz, knobs, train_dataset_uri, 
                                     test_dataset_uri):
         model_inst = clazz()
 
@@ -148,9 +286,8 @@ class TrainWorker(object):
         # Evaluate model
         score = model_inst.evaluate(test_dataset_uri)
 
-        # Dump and pickle model parameters
+        # Dump model parameters
         parameters = model_inst.dump_parameters()
-        parameters = pickle.dumps(parameters)
         model_inst.destroy()
 
         # Export model logs
@@ -169,12 +306,40 @@ class TrainWorker(object):
         self._db.commit()
         return trial
 
+    # Atomically creates trials for the sets of knobs, as far as the model's trial count budget allows
+    # Returns a list of (trial_id, knobs) of created trials
+    def _create_new_trials_within_budget(self, model_id, train_job_id, knobs_list, budget):
+        # By default, budget is model trial count of 10
+        max_trials = budget.get(BudgetType.MODEL_TRIAL_COUNT, 10)
+
+        with self._db:
+            trials = self._db.create_trials_within_budget(model_id, train_job_id, knobs_list, max_trials)
+            trials = [(x.id, x.knobs) for x in trials]
+            self._db.commit()
+
+        return trials
+
+    # Gets proposals of `count` sets of knob values from advisor
+    def _get_proposals_from_advisor(self, advisor_id, count):
+        res = self._client.generate_proposals(advisor_id, count)
+        knobs_list = res['knobs_list']
+        return knobs_list
+
     # Gets proposal of a set of knob values from advisor
     def _get_proposal_from_advisor(self, advisor_id):
         res = self._client.generate_proposal(advisor_id)
         knobs = res['knobs']
         return knobs
 
+    # Release proposals of knobs that will not be tried to advisor
+    def _release_proposals_to_advisor(self, advisor_id, knobs_list):
+        try:
+            self._client.release_proposals(advisor_id, knobs_list)
+        except Exception:
+            # Throw just a warning - unreleased proposals expire from advisor eventually
+            logger.warning('Error while releasing proposals to advisor:')
+            logger.warning(traceback.format_exc())
+
     # Feedback result of knobs to advisor
     def _feedback_to_advisor(self, advisor_id, knobs, score):
         self._client.feedback_to_advisor(advisor_id, knobs, score)
@@ -210,10 +375,18 @@ class TrainWorker(object):
     def _if_budget_reached(self, budget, train_job_id, model_id):
         # By default, budget is model trial count of 10
         max_trials = budget.get(BudgetType.MODEL_TRIAL_COUNT, 10)
-        trials = self._db.get_trials_of_train_job(train_job_id)
-        trials = [x for x in trials if x.status in [TrialStatus.COMPLETED, TrialStatus.ERRORED]]
-        model_trials = [x for x in trials if x.model_id == model_id]
-        return len(model_trials) >= max_trials
+        trial_count = self._db.count_trials_of_train_job(train_job_id, model_id, 
+                                                        statuses=[TrialStatus.COMPLETED, TrialStatus.ERRORED])
+        return trial_count >= max_trials
+
+    # Returns whether the worker's budget is taken up by created trials, counting them as 
+    # `Database.create_trials_within_budget` does (consider RUNNING, COMPLETED or ERRORED trials)
+    def _if_budget_taken(self, budget, train_job_id, model_id):
+        # By default, budget is model trial count of 10
+        max_trials = budget.get(BudgetType.MODEL_TRIAL_COUNT, 10)
+        trial_count = self._db.count_trials_of_train_job(train_job_id, model_id, 
+                                                        statuses=[TrialStatus.RUNNING, TrialStatus.COMPLETED, TrialStatus.ERRORED])
+        return trial_count >= max_trials
 
     def _read_worker_info(self):
         worker = self._db.get_train_job_worker(self._service_id)
@@ -221,7 +394,7 @@ class TrainWorker(object):
         if worker is None:
             raise InvalidWorkerException()
 
-        model = self._db.get_model(worker.model_id)
+        model = self._db.get_model(worker.model_id, with_model_file=True)
         train_job = self._db.get_train_job(worker.train_job_id)
 
         if model is None:
@@ -254,6 +427,23 @@ class TrainWorker(object):
         client.login(email=superadmin_email, password=superadmin_password)
         return client
 
+# Runs a trial in a process of the pool, saving its model's parameters to the artifact store from there
+# Returns (score, parameters_uri, parameters_checksum, logs)
+def _run_trial(artifact_store, model_file_bytes, model_class, knobs, train_dataset_uri, test_dataset_uri, trial_id):
+    # Processes of the pool are forked with the service's signal handlers, which mark the service as stopped
+    # in DB & stop the worker, so that terminating a trial's process would not kill it
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    # Never share the worker's DB connections
+    dispose_inherited_engines()
+
+    clazz = load_model_class(model_file_bytes, model_class)
+    (score, parameters, logs) = TrainWorker._train_and_evaluate_model(clazz, knobs, train_dataset_uri, 
+                                                                    test_dataset_uri)
+    (parameters_uri, parameters_checksum) = dump_parameters(artifact_store, trial_id, parameters)
+    return (score, parameters_uri, parameters_checksum, logs)
+
 class TrainModelLogUtilsLogger(ModelLogUtilsLogger):
     def __init__(self):
         self._job_logger = JobLogger()
@@ -6,5 +6,5 @@ from rafiki.advisor.app import app
 configure_logging('advisor')
 
 if __name__ == "__main__":
-    # No threading since data is in-memory
+    # No threading since advisors rebuilt from cache are kept in-memory
     app.run(host='0.0.0.0', port=os.getenv('ADVISOR_PORT', 3002), threaded=False)
@@ -1,5 +1,7 @@
 docker run --rm --name $ADVISOR_HOST \
   --network $DOCKER_NETWORK \
+  -e REDIS_HOST=$REDIS_HOST \
+  -e REDIS_PORT=$REDIS_PORT \
   -v $LOCAL_WORKDIR_PATH:$DOCKER_WORKDIR_PATH \
   -p $ADVISOR_EXT_PORT:$ADVISOR_PORT \
   $RAFIKI_IMAGE_ADVISOR:$RAFIKI_VERSION
\ No newline at end of file
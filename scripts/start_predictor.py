@@ -1,13 +1,14 @@
 import os
+import uvicorn
 
 from rafiki.utils.service import run_service
 from rafiki.db import Database
 from rafiki.predictor.app import app
 
 def start_service(service_id, service_type):
-    app.run(host='0.0.0.0', 
-            port=os.getenv('PREDICTOR_PORT', 3003), 
-            threaded=True)
+    uvicorn.run(app, 
+                host='0.0.0.0', 
+                port=int(os.getenv('PREDICTOR_PORT', 3003)))
 
 def end_service(service_id, service_type):
     pass
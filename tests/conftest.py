@@ -0,0 +1,90 @@
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import StaticPool
+import pytest
+
+import rafiki.db.database
+from rafiki.db import Database
+from rafiki.constants import ServiceType, TrialStatus, UserType
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={ 'check_same_thread': False })
+    Session = scoped_session(sessionmaker(bind=engine))
+    monkeypatch.setattr(rafiki.db.database, '_get_engine', lambda db_connection_url, read_only: (engine, Session))
+    return engine
+
+@pytest.fixture
+def db(engine):
+    db = Database()
+    db.create_tables()
+    return db
+
+# Seeds a user with `job_count` train jobs of an app, each with `model_count` models' trials & train workers,
+# and a running inference job with an inference worker per model
+# Returns the IDs of the user, and of its latest train job & inference job
+@pytest.fixture
+def seed(db):
+    def seed(app, job_count, model_count, trials_per_model):
+        with db:
+            user = db.create_user('{}@rafiki'.format(app), b'password_hash', UserType.APP_DEVELOPER)
+            db.commit()
+            models = [
+                db.create_model(user.id, '{}_model_{}'.format(app, i), 'TASK', b'model_file_bytes', 'Model', 'image', {})
+                for i in range(model_count)
+            ]
+            db.commit()
+
+            for app_version in range(1, job_count + 1):
+                train_job = db.create_train_job(user.id, app, app_version, 'TASK', 'train_uri', 'test_uri', {})
+                db.commit()
+
+                trials = []
+                for (i, model) in enumerate(models * trials_per_model):
+                    trial = db.create_trial(model.id, train_job.id, { 'knob': i })
+                    trial.status = TrialStatus.COMPLETED
+                    trial.score = i
+                    trials.append(trial)
+
+                inference_job = db.create_inference_job(user.id, train_job.id)
+                db.mark_inference_job_as_running(inference_job)
+                db.commit()
+
+                predictor_service = db.create_service(ServiceType.PREDICT, 'SWARM', 'image')
+                db.commit()
+                db.update_inference_job(inference_job, predictor_service.id)
+
+                for (model, trial) in zip(models, trials):
+                    service = db.create_service(ServiceType.TRAIN, 'SWARM', 'image')
+                    db.commit()
+                    db.create_train_job_worker(service.id, train_job.id, model.id)
+
+                    service = db.create_service(ServiceType.INFERENCE, 'SWARM', 'image')
+                    db.commit()
+                    db.create_inference_job_worker(service.id, inference_job.id, trial.id)
+
+                db.commit()
+
+            return {
+                'user_id': user.id,
+                'train_job_id': train_job.id,
+                'inference_job_id': inference_job.id
+            }
+
+    return seed
+
+# Counts the SQL statements executed while calling `fn`
+@pytest.fixture
+def count_statements(engine):
+    def count_statements(fn):
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(engine, 'before_cursor_execute', listener)
+        try:
+            result = fn()
+        finally:
+            event.remove(engine, 'before_cursor_execute', listener)
+
+        return (result, len(statements))
+
+    return count_statements
@@ -0,0 +1,84 @@
+import pytest
+
+from rafiki.admin import Admin
+
+# Apps seeded with few & many rows, as (job_count, model_count, trials_per_model)
+APP_SIZES = {
+    'small_app': (1, 1, 1),
+    'large_app': (4, 6, 3)
+}
+
+@pytest.fixture
+def admin(db, monkeypatch):
+    monkeypatch.setenv('RAFIKI_IMAGE_WORKER', 'rafiki_worker')
+    monkeypatch.setenv('RAFIKI_IMAGE_PREDICTOR', 'rafiki_predictor')
+    monkeypatch.setenv('RAFIKI_VERSION', 'test')
+    monkeypatch.setenv('PREDICTOR_PORT', '3003')
+
+    # Listings never touch containers
+    return Admin(db=db, container_manager=object())
+
+@pytest.fixture
+def app_ids(seed):
+    return {
+        app: seed(app, job_count=job_count, model_count=model_count, trials_per_model=trials_per_model)
+        for (app, (job_count, model_count, trials_per_model)) in APP_SIZES.items()
+    }
+
+# Asserts that listing each app with `list_app` executes `expected_count` SQL statements, regardless of
+# the number of rows listed
+def assert_statement_count(admin, count_statements, app_ids, list_app, expected_count):
+    app_to_result = {}
+    for (app, ids) in app_ids.items():
+        with admin:
+            (app_to_result[app], count) = count_statements(lambda: list_app(app, ids))
+
+        assert count == expected_count, app
+
+    # Sanity check that the apps' listings are of different sizes
+    assert len(app_to_result['large_app']) > len(app_to_result['small_app']) > 0
+    return app_to_result
+
+def test_get_train_job(admin, count_statements, app_ids):
+    app_to_result = assert_statement_count(admin, count_statements, app_ids,
+        lambda app, ids: admin.get_train_job(app)['workers'],
+        expected_count=2)
+
+    assert all(x['model_name'].startswith('large_app') for x in app_to_result['large_app'])
+
+def test_get_train_jobs_of_app(admin, count_statements, app_ids):
+    assert_statement_count(admin, count_statements, app_ids,
+        lambda app, ids: admin.get_train_jobs_of_app(app),
+        expected_count=1)
+
+def test_get_train_jobs_by_user(admin, count_statements, app_ids):
+    assert_statement_count(admin, count_statements, app_ids,
+        lambda app, ids: admin.get_train_jobs_by_user(ids['user_id']),
+        expected_count=1)
+
+def test_get_trials_of_train_job(admin, count_statements, app_ids):
+    assert_statement_count(admin, count_statements, app_ids,
+        lambda app, ids: admin.get_trials_of_train_job(app),
+        expected_count=2)
+
+def test_get_best_trials_of_train_job(admin, count_statements, app_ids):
+    assert_statement_count(admin, count_statements, app_ids,
+        lambda app, ids: admin.get_best_trials_of_train_job(app, max_count=5),
+        expected_count=2)
+
+def test_get_running_inference_job(admin, count_statements, app_ids):
+    app_to_result = assert_statement_count(admin, count_statements, app_ids,
+        lambda app, ids: admin.get_running_inference_job(app)['workers'],
+        expected_count=4)
+
+    assert all(x['trial']['model_name'].startswith('large_app') for x in app_to_result['large_app'])
+
+def test_get_inference_jobs_of_app(admin, count_statements, app_ids):
+    assert_statement_count(admin, count_statements, app_ids,
+        lambda app, ids: admin.get_inference_jobs_of_app(app),
+        expected_count=1)
+
+def test_get_inference_jobs_by_user(admin, count_statements, app_ids):
+    assert_statement_count(admin, count_statements, app_ids,
+        lambda app, ids: admin.get_inference_jobs_by_user(ids['user_id']),
+        expected_count=1)
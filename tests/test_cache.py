@@ -0,0 +1,116 @@
+import asyncio
+import threading
+import uuid
+from fakeredis import TcpFakeServer
+import pytest
+
+from rafiki.cache import Cache
+from rafiki.cache.async_cache import AsyncCache
+
+PREDICTOR_COUNT = 4
+WORKER_COUNT = 2
+REPLICAS_PER_WORKER = 2
+QUERIES_PER_PREDICTOR = 200
+POP_TIMEOUT = 1
+TEST_TIMEOUT = 60
+
+@pytest.fixture
+def redis_address():
+    server = TcpFakeServer(('127.0.0.1', 0), server_type='redis')
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_address
+    server.shutdown()
+    server.server_close()
+
+# Replicas of inference workers block on their worker's queue of queries, and reply to each batch of
+# queries with the queries themselves as predictions
+def run_worker_replica(redis_address, worker_id, stop_event, popped_query_ids, lock):
+    (host, port) = redis_address
+    cache = Cache(host=host, port=port)
+
+    while True:
+        (query_ids, reply_ids, queries_list) = \
+            cache.pop_queries_of_worker(worker_id, batch_size=8, timeout=POP_TIMEOUT)
+
+        if len(query_ids) == 0 and stop_event.is_set():
+            return
+
+        with lock:
+            popped_query_ids.extend(query_ids)
+
+        for (query_id, reply_id, queries) in zip(query_ids, reply_ids, queries_list):
+            cache.add_predictions_of_worker(worker_id, query_id, reply_id, queries)
+
+# Each predictor sends batches of queries to workers while waiting on predictions at its own reply key
+# Returns { <query_id>: (<queries>, <predictions>) }
+async def run_predictor(redis_address, worker_ids):
+    (host, port) = redis_address
+    cache = AsyncCache(host=host, port=port)
+    await cache.connect()
+
+    reply_id = str(uuid.uuid4())
+    query_id_to_queries = {}
+    query_id_to_predictions = {}
+
+    async def add_queries():
+        for i in range(QUERIES_PER_PREDICTOR):
+            query_id = str(uuid.uuid4())
+            queries = [[i, i + 1], [i + 2, i + 3]]
+            query_id_to_queries[query_id] = queries
+            await cache.add_queries_of_workers({ worker_ids[i % len(worker_ids)]: query_id }, queries, reply_id)
+
+    async def pop_predictions():
+        while len(query_id_to_predictions) < QUERIES_PER_PREDICTOR:
+            for (query_id, predictions) in await cache.pop_predictions(reply_id, timeout=POP_TIMEOUT):
+                assert query_id not in query_id_to_predictions
+                query_id_to_predictions[query_id] = predictions
+
+    try:
+        await asyncio.gather(add_queries(), pop_predictions())
+    finally:
+        await cache.disconnect()
+
+    return {
+        query_id: (queries, query_id_to_predictions[query_id])
+        for (query_id, queries) in query_id_to_queries.items()
+    }
+
+def test_no_queries_or_predictions_lost_with_concurrent_predictors_and_workers(redis_address):
+    worker_ids = ['worker-{}'.format(i) for i in range(WORKER_COUNT)]
+    stop_event = threading.Event()
+    popped_query_ids = []
+    lock = threading.Lock()
+
+    replicas = [
+        threading.Thread(target=run_worker_replica,
+                        args=(redis_address, worker_id, stop_event, popped_query_ids, lock))
+        for worker_id in worker_ids
+        for _ in range(REPLICAS_PER_WORKER)
+    ]
+    for replica in replicas:
+        replica.start()
+
+    async def run_predictors():
+        return await asyncio.wait_for(
+            asyncio.gather(*[run_predictor(redis_address, worker_ids) for _ in range(PREDICTOR_COUNT)]),
+            timeout=TEST_TIMEOUT
+        )
+
+    try:
+        results = asyncio.new_event_loop().run_until_complete(run_predictors())
+    finally:
+        stop_event.set()
+        for replica in replicas:
+            replica.join()
+
+    # Each batch of queries is popped by exactly 1 replica
+    query_count = PREDICTOR_COUNT * QUERIES_PER_PREDICTOR
+    assert len(popped_query_ids) == query_count
+    assert len(set(popped_query_ids)) == query_count
+
+    # Each predictor receives the predictions of each of its batches of queries, intact
+    for query_id_to_result in results:
+        assert len(query_id_to_result) == QUERIES_PER_PREDICTOR
+        for (queries, predictions) in query_id_to_result.values():
+            assert predictions.tolist() == queries
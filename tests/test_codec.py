@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from rafiki.cache.codec import JsonCodec, NumpyCodec, decode_payload
+
+IMAGE_SHAPE = (28, 28)
+
+@pytest.fixture
+def image_query():
+    # As sent for image classification, a grayscale image's pixels as a nested list of ints
+    return np.random.RandomState(0).randint(0, 256, size=IMAGE_SHAPE).tolist()
+
+def test_numpy_codec_encodes_image_query_smaller_than_json(image_query):
+    numpy_size = len(NumpyCodec().encode([image_query]))
+    json_size = len(JsonCodec().encode([image_query]))
+    assert numpy_size < json_size
+
+    # Pixels are encoded as 1 byte each
+    assert numpy_size < IMAGE_SHAPE[0] * IMAGE_SHAPE[1] + 100
+
+@pytest.mark.parametrize('obj', [
+    [[0, 255], [3, 4]],
+    [[-1, 70000], [3, 4]],
+    [[0.5, 1.5]],
+    np.arange(6, dtype=np.int32).reshape(2, 3),
+    np.array([], dtype=np.int64),
+    [[True, False]],
+    ['a', 'b'],
+    [[1, 2], [3]],
+    { 'a': 1 }
+])
+def test_numpy_codec_round_trips(obj):
+    codec = NumpyCodec()
+    for decoded in [codec.decode(codec.encode(obj)), decode_payload(codec.encode(obj))]:
+        if isinstance(decoded, np.ndarray):
+            expected = np.asarray(obj)
+            assert decoded.dtype == expected.dtype
+            assert decoded.tolist() == expected.tolist()
+        else:
+            assert decoded == obj
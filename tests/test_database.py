@@ -0,0 +1,76 @@
+import pytest
+
+MODEL_COUNT = 5
+TRIALS_PER_MODEL = 2
+
+@pytest.fixture
+def ids(seed):
+    return seed('app', job_count=1, model_count=MODEL_COUNT, trials_per_model=TRIALS_PER_MODEL)
+
+# Lists rows then reads each of them, so that any lazy loads of attributes that listings read are counted
+def list_and_read_rows(count_statements, list_rows, read_row):
+    def run():
+        rows = list_rows()
+        for row in rows:
+            read_row(*row)
+        return rows
+
+    (rows, count) = count_statements(run)
+    assert len(rows) > 0
+    return count
+
+def read_service(service):
+    return (service.id, service.status, service.replicas, service.datetime_started, service.datetime_stopped)
+
+def read_trial(trial):
+    return (trial.id, trial.knobs, trial.status, trial.score, trial.datetime_started, trial.datetime_stopped)
+
+def test_workers_of_train_job_listed_in_1_query(db, count_statements, ids):
+    with db:
+        count = list_and_read_rows(count_statements,
+            lambda: db.get_workers_with_services_of_train_job(ids['train_job_id']),
+            lambda worker, service, model: (read_service(service), model.name))
+
+    assert count == 1
+
+def test_workers_of_inference_job_listed_in_1_query(db, count_statements, ids):
+    with db:
+        count = list_and_read_rows(count_statements,
+            lambda: db.get_workers_with_services_of_inference_job(ids['inference_job_id']),
+            lambda worker, service, trial, model: (read_service(service), read_trial(trial), model.name))
+
+    assert count == 1
+
+def test_trials_of_train_job_listed_in_1_query(db, count_statements, ids):
+    with db:
+        count = list_and_read_rows(count_statements,
+            lambda: db.get_trials_with_models_of_train_job(ids['train_job_id']),
+            lambda trial, model: (read_trial(trial), model.name))
+
+    assert count == 1
+
+def test_best_trials_of_train_job_listed_in_1_query(db, count_statements, ids):
+    with db:
+        count = list_and_read_rows(count_statements,
+            lambda: db.get_best_trials_with_models_of_train_job(ids['train_job_id'], max_count=3),
+            lambda trial, model: (read_trial(trial), model.name))
+
+    assert count == 1
+
+def test_inference_jobs_of_app_listed_in_1_query(db, count_statements, ids):
+    with db:
+        count = list_and_read_rows(count_statements,
+            lambda: db.get_inference_jobs_with_train_jobs_of_app('app'),
+            lambda inference_job, train_job, service: \
+                (inference_job.id, inference_job.status, train_job.app, train_job.app_version, service.ext_hostname))
+
+    assert count == 1
+
+def test_inference_jobs_of_user_listed_in_1_query(db, count_statements, ids):
+    with db:
+        count = list_and_read_rows(count_statements,
+            lambda: db.get_inference_jobs_with_train_jobs_by_user(ids['user_id']),
+            lambda inference_job, train_job, service: \
+                (inference_job.id, inference_job.status, train_job.app, train_job.app_version, service.ext_hostname))
+
+    assert count == 1
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+from rafiki.constants import TaskType, EnsembleMethod
+from rafiki.predictor.ensemble import ensemble_predictions
+
+@pytest.mark.parametrize('weights', [
+    [None, 1],
+    [float('nan'), 1],
+    [float('inf'), 1]
+])
+def test_weighted_mean_falls_back_to_equal_weights_if_weights_not_finite(weights):
+    predictions_list = [[1.0, 2.0], [3.0, 6.0]]
+    predictions = ensemble_predictions(predictions_list, TaskType.TABLE_REGRESSION, 
+                                    method=EnsembleMethod.WEIGHTED_MEAN, weights=weights)
+    assert np.asarray(predictions).tolist() == [2.0, 4.0]
+
+def test_weighted_mean_uses_weights():
+    predictions_list = [[1.0], [3.0]]
+    predictions = ensemble_predictions(predictions_list, TaskType.TABLE_REGRESSION, 
+                                    method=EnsembleMethod.WEIGHTED_MEAN, weights=[3, 1])
+    assert np.asarray(predictions).tolist() == [1.5]
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from rafiki.model import load_model_class, load_model_class_from_file
+from rafiki.worker.model_cache import ModelCache
+
+MODEL_FILE_BYTES = b'class Model(object):\n    pass\n'
+
+@pytest.fixture
+def model_cache(tmpdir):
+    return ModelCache(folder_path=str(tmpdir), max_count=2)
+
+def test_parameters_round_trip(model_cache):
+    parameters = {
+        'weights': np.arange(6, dtype=np.float32).reshape(2, 3),
+        'empty': np.zeros(0),
+        'bytes': b'\x00\x01',
+        'str': 'vocab',
+        'int': 3,
+        'float': 0.5,
+        'none': None,
+        'list': [1, 2]
+    }
+    model_cache.put('trial', MODEL_FILE_BYTES, 'Model', { 'knob': 1 }, parameters)
+
+    (model_file_path, model_file_hash, model_class, knobs, cached_parameters) = model_cache.get('trial')
+    assert knobs == { 'knob': 1 }
+    assert set(cached_parameters) == set(parameters)
+    for (name, value) in parameters.items():
+        if isinstance(value, np.ndarray):
+            assert np.array_equal(cached_parameters[name], value)
+            assert cached_parameters[name].dtype == value.dtype
+        else:
+            assert cached_parameters[name] == value
+
+    # Arrays are memory-mapped copy-on-write, so models can't change the cache
+    assert isinstance(cached_parameters['weights'], np.memmap)
+    cached_parameters['weights'][0, 0] = 100
+    assert model_cache.get('trial')[4]['weights'][0, 0] == 0
+
+    # Model class is imported from the cached model file
+    clazz = load_model_class_from_file(model_file_path, model_file_hash, model_class)
+    assert clazz is load_model_class(MODEL_FILE_BYTES, 'Model')
+
+def test_parameters_not_dict_of_strings_pickled_whole(model_cache):
+    parameters = { (1, 2): 'a', 3: 'b' }
+    model_cache.put('trial', MODEL_FILE_BYTES, 'Model', {}, parameters)
+    assert model_cache.get('trial')[4] == parameters
+
+def test_least_recently_used_trials_evicted(model_cache):
+    model_cache.put('trial_1', MODEL_FILE_BYTES, 'Model', {}, {})
+    model_cache.put('trial_2', MODEL_FILE_BYTES, 'Model', {}, {})
+    model_cache.put('trial_3', MODEL_FILE_BYTES, 'Model', {}, {})
+
+    assert model_cache.get('trial_1') is None
+    assert model_cache.get('trial_2') is not None
+    assert model_cache.get('trial_3') is not None